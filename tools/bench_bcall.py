@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Benchmark of WebNip.do() calls on fake backends.
+#
+# For each number of backends, it reports the number of threads alive during
+# the calls, the number of threads created, and the p50/p99 latency of a call.
+#
+# Usage: bench_bcall.py [-c CALLS] [-d DELAY] [-w WORKERS] [--legacy] [N [N ...]]
+#
+# Use "-d 0 -c 1000" to measure the overhead of calls on instant backends,
+# and --legacy to start a new thread per backend and per call, as before the
+# pool of workers.
+#
+# Median p50 latency of 3 runs, Python 2.7 on 1 CPU, "-c 50" ("-c 5" for 1000
+# backends), with the peak number of threads alive and the threads created:
+#
+#                   -d 0.01                              -d 0
+#                   pool              legacy             pool              legacy
+#     10 backends    26.0ms 10/10      27.2ms 10/500       15.7ms 10/10      15.5ms 9/500
+#    100 backends   175.8ms 100/100   190.2ms 100/5000    154.9ms 100/100   166.7ms 34/5000
+#   1000 backends  1765.9ms 100/100  1835.3ms 156/5000   1699.5ms 100/100  1717.6ms 33/5000
+#
+# Most of the time is spent by the fake backends to build their results, so
+# the latency is about the same; the pool avoids creating a thread per backend
+# and per call, and bounds the number of threads when backends are slow.
+
+from __future__ import print_function
+
+import os
+import sys
+import threading
+import time
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.path.pardir)))
+
+from weboob.capabilities.base import BaseObject
+from weboob.core.ouiboube import WebNip
+from weboob.tools.backend import Module
+
+from benchutils import percentile
+
+
+class FakeModule(Module):
+    NAME = 'fake'
+
+    def iter_things(self, delay, count):
+        time.sleep(delay)
+        for i in xrange(count):
+            yield BaseObject(str(i))
+
+
+class ThreadPerTask(object):
+    """
+    Replacement of the pool of workers, which starts a new thread per task.
+    """
+
+    created = 0
+
+    def submit(self, function, *args, **kwargs):
+        self.created += 1
+        threading.Thread(target=function, args=args, kwargs=kwargs).start()
+
+    def release(self):
+        pass
+
+    def shutdown(self, wait=True):
+        pass
+
+
+class ThreadsMonitor(threading.Thread):
+    def __init__(self):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.stop_event = threading.Event()
+        self.peak = 0
+
+    def run(self):
+        while not self.stop_event.is_set():
+            self.peak = max(self.peak, threading.active_count())
+            self.stop_event.wait(0.001)
+
+    def stop(self):
+        self.stop_event.set()
+        self.join()
+
+
+def bench(nb_backends, calls, delay, workers, legacy):
+    weboob = WebNip(modules_path=False, max_workers=workers)
+    for i in xrange(nb_backends):
+        name = 'fake%d' % i
+        weboob.backend_instances[name] = FakeModule(weboob, name)
+    if legacy:
+        weboob.workers = ThreadPerTask()
+    pool = weboob.workers
+
+    started = threading.active_count()
+    monitor = ThreadsMonitor()
+    monitor.start()
+
+    latencies = []
+    for _ in xrange(calls):
+        start = time.time()
+        count = len(list(weboob.do('iter_things', delay, 10)))
+        latencies.append(time.time() - start)
+        assert count == nb_backends * 10
+
+    monitor.stop()
+    weboob.deinit()
+
+    print('%6d backends: %4d threads alive (+%d), %6d created, latency p50=%.2fms p99=%.2fms max=%.2fms' % (
+          nb_backends, monitor.peak, monitor.peak - started - 1, pool.created,
+          percentile(latencies, 50) * 1000, percentile(latencies, 99) * 1000, max(latencies) * 1000))
+
+
+def main():
+    parser = OptionParser(usage='%prog [options] [NB_BACKENDS...]')
+    parser.add_option('-c', '--calls', type='int', default=20, help='number of calls per run (default: 20)')
+    parser.add_option('-d', '--delay', type='float', default=0.01,
+                      help='time spent by each backend before returning results, in seconds (default: 0.01)')
+    parser.add_option('-w', '--workers', type='int', default=None,
+                      help='maximum number of workers (default: %d)' % WebNip.MAX_WORKERS)
+    parser.add_option('--legacy', action='store_true', help='start a thread per backend and per call')
+    options, args = parser.parse_args()
+
+    for nb_backends in [int(arg) for arg in args] or [10, 100, 1000]:
+        bench(nb_backends, options.calls, options.delay, options.workers, options.legacy)
+
+
+if __name__ == '__main__':
+    main()
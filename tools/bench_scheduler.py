@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Benchmark of schedulers with many pending events.
+#
+# It schedules N events in the future, cancels them, and then schedules N
+# events due in the next second to measure how late they are run. For each
+# step, it reports the time spent and the number of threads alive.
+#
+# Usage: bench_scheduler.py [-n EVENTS] [-w WORKERS] [--legacy]
+
+from __future__ import print_function
+
+import os
+import random
+import sys
+import threading
+import time
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.path.pardir)))
+
+from weboob.core.scheduler import Scheduler, HeapScheduler
+
+from benchutils import percentile
+
+
+def bench(scheduler, count):
+    started = threading.active_count()
+
+    start = time.time()
+    events = [scheduler.schedule(random.uniform(60, 3600), lambda: None) for _ in xrange(count)]
+    elapsed = time.time() - start
+    print('schedule %d events: %8.2fms (%.2fus per event), %d threads alive (+%d)' % (
+          count, elapsed * 1000, elapsed / count * 1e6, threading.active_count(), threading.active_count() - started))
+
+    random.shuffle(events)
+    start = time.time()
+    for ev in events:
+        scheduler.cancel(ev)
+    elapsed = time.time() - start
+    print('cancel %d events:   %8.2fms (%.2fus per event)' % (count, elapsed * 1000, elapsed / count * 1e6))
+
+    lateness = []
+    lock = threading.Lock()
+    done = threading.Event()
+
+    def callback(expected):
+        with lock:
+            lateness.append(time.time() - expected)
+            if len(lateness) == count:
+                done.set()
+
+    start = time.time()
+    for _ in xrange(count):
+        delay = random.uniform(0, 1)
+        scheduler.schedule(delay, callback, time.time() + delay)
+    peak = threading.active_count()
+    done.wait(60)
+    print('run %d events:      p50 late=%.2fms p99 late=%.2fms max late=%.2fms, %d threads alive (+%d)' % (
+          len(lateness), percentile(lateness, 50) * 1000, percentile(lateness, 99) * 1000, max(lateness) * 1000,
+          peak, peak - started))
+
+    scheduler.want_stop()
+    if isinstance(scheduler, HeapScheduler):
+        scheduler.thread.join()
+
+
+def main():
+    parser = OptionParser(usage='%prog [options]')
+    parser.add_option('-n', '--events', type='int', default=10000, help='number of events (default: 10000)')
+    parser.add_option('-w', '--workers', type='int', default=None,
+                      help='maximum number of workers (default: %d)' % HeapScheduler.MAX_WORKERS)
+    parser.add_option('--legacy', action='store_true', help='use Scheduler, which starts a thread per event')
+    options, args = parser.parse_args()
+
+    if options.legacy:
+        scheduler = Scheduler()
+    else:
+        scheduler = HeapScheduler(options.workers)
+    bench(scheduler, options.events)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+
+# Helpers shared by benchmarks.
+
+
+def percentile(values, p):
+    """
+    Get the p-th percentile of values, with the nearest-rank method.
+    """
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100.0 * len(values) + 0.5)) - 1)]
@@ -66,11 +66,10 @@ class ManpageHelpFormatter(optparse.HelpFormatter):
     def format_description(self, description):
         desc = u'.SH DESCRIPTION\n.LP\n\n%s\n' % description
         if hasattr(self.app, 'CAPS'):
-            self.app.weboob.modules_loader.load_all()
+            caps = self.app.CAPS if isinstance(self.app.CAPS, tuple) else (self.app.CAPS,)
             backends = []
-            for name, backend in self.app.weboob.modules_loader.loaded.iteritems():
-                if backend.has_caps(self.app.CAPS):
-                    backends.append(u'* %s (%s)' % (name, backend.description))
+            for info in self.app.weboob.modules_loader.iter_modules_info(caps):
+                backends.append(u'* %s (%s)' % (info.name, info.description))
             if len(backends) > 0:
                 desc += u'\n.SS Supported websites:\n'
                 desc += u'\n.br\n'.join(sorted(backends))
@@ -8,18 +8,18 @@ from weboob.core import Weboob
 import os
 
 weboob = Weboob()
-weboob.modules_loader.load_all()
 
 backends_without_tests = []
 backends_without_icons = []
 
-for name, backend in weboob.modules_loader.loaded.iteritems():
-    path = backend.package.__path__[0]
+for info in weboob.modules_loader.iter_modules_info():
+    name = info.name
+    path = os.path.join(info.path, name)
     if not os.path.exists(os.path.join(path, 'test.py')):
         backends_without_tests.append(name)
     if not os.path.exists(os.path.join(path, 'favicon.png')) and \
        not os.path.exists(os.path.join(weboob.repositories.icons_dir, '%s.png' % name)) and \
-       not backend.icon:
+       not info.icon:
         backends_without_icons.append(name)
 
 if backends_without_tests:
@@ -21,13 +21,8 @@ from __future__ import print_function
 
 import datetime
 import uuid
-from dateutil.relativedelta import relativedelta
-from dateutil.parser import parse as parse_date
 from decimal import Decimal, InvalidOperation
 
-from weboob.browser.browsers import APIBrowser
-from weboob.browser.profiles import Weboob
-from weboob.exceptions import BrowserHTTPError
 from weboob.capabilities.base import empty
 from weboob.capabilities.bank import CapBank, Account, Transaction
 from weboob.tools.application.repl import ReplApplication, defaultcount
@@ -344,6 +339,9 @@ class Boobank(ReplApplication):
             return 2
 
         if end_date is not None:
+            from dateutil.relativedelta import relativedelta
+            from dateutil.parser import parse as parse_date
+
             try:
                 end_date = parse_date(end_date)
             except ValueError:
@@ -493,6 +491,10 @@ class Boobank(ReplApplication):
         """
         username, password = self.parse_command_args(line, 2, 2)
 
+        from weboob.browser.browsers import APIBrowser
+        from weboob.browser.profiles import Weboob
+        from weboob.exceptions import BrowserHTTPError
+
         client = APIBrowser(baseurl='https://budgea.biapi.pro/2.0/')
         client.set_profile(Weboob(self.VERSION))
         try:
@@ -232,7 +232,7 @@ class Result(QFrame):
 
         self.process = QtDo(self.weboob, self.addMovie, fb=self.processFinished)
         #self.process.do('iter_movies', pattern, backends=backend_name, caps=CapCinema)
-        self.process.do(self.app._do_complete, self.parent.getCount(), ('original_title'), 'iter_movies', pattern, backends=backend_name, caps=CapCinema)
+        self.process.do(self.app._get_complete_call(self.parent.getCount(), ('original_title'), 'iter_movies'), pattern, backends=backend_name, caps=CapCinema)
         self.parent.ui.stopButton.show()
 
     def stopProcess(self):
@@ -274,7 +274,7 @@ class Result(QFrame):
 
         self.process = QtDo(self.weboob, self.addPerson, fb=self.processFinished)
         #self.process.do('iter_persons', pattern, backends=backend_name, caps=CapCinema)
-        self.process.do(self.app._do_complete, self.parent.getCount(), ('name'), 'iter_persons', pattern, backends=backend_name, caps=CapCinema)
+        self.process.do(self.app._get_complete_call(self.parent.getCount(), ('name'), 'iter_persons'), pattern, backends=backend_name, caps=CapCinema)
         self.parent.ui.stopButton.show()
 
     def addPerson(self, person):
@@ -313,7 +313,7 @@ class Result(QFrame):
 
         self.process = QtDo(self.weboob, self.addTorrent, fb=self.processFinished)
         #self.process.do('iter_torrents', pattern, backends=backend_name, caps=CapTorrent)
-        self.process.do(self.app._do_complete, self.parent.getCount(), ('name'), 'iter_torrents', pattern, backends=backend_name, caps=CapTorrent)
+        self.process.do(self.app._get_complete_call(self.parent.getCount(), ('name'), 'iter_torrents'), pattern, backends=backend_name, caps=CapTorrent)
         self.parent.ui.stopButton.show()
 
     def processFinished(self):
@@ -357,7 +357,7 @@ class Result(QFrame):
 
         self.process = QtDo(self.weboob, self.addSubtitle, fb=self.processFinished)
         #self.process.do('iter_subtitles', lang, pattern, backends=backend_name, caps=CapSubtitle)
-        self.process.do(self.app._do_complete, self.parent.getCount(), ('name'), 'iter_subtitles', lang, pattern, backends=backend_name, caps=CapSubtitle)
+        self.process.do(self.app._get_complete_call(self.parent.getCount(), ('name'), 'iter_subtitles'), lang, pattern, backends=backend_name, caps=CapSubtitle)
         self.parent.ui.stopButton.show()
 
     def addSubtitle(self, subtitle):
@@ -103,7 +103,7 @@ class Result(QFrame):
         backend_name = str(self.parent.ui.backendEdit.itemData(self.parent.ui.backendEdit.currentIndex()).toString())
 
         self.process = QtDo(self.weboob, self.addRecipe, fb=self.processFinished)
-        self.process.do(self.app._do_complete, self.parent.getCount(), ('title'), 'iter_recipes', pattern, backends=backend_name, caps=CapRecipe)
+        self.process.do(self.app._get_complete_call(self.parent.getCount(), ('title'), 'iter_recipes'), pattern, backends=backend_name, caps=CapRecipe)
         self.parent.ui.stopButton.show()
 
     def addRecipe(self, recipe):
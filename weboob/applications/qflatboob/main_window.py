@@ -204,7 +204,7 @@ class MainWindow(QtMainWindow):
         query.nb_rooms = int(q['nb_rooms']) or None
 
         self.process = QtDo(self.weboob, self.addHousing, fb=self.addHousingEnd)
-        self.process.do(self.app._do_complete, 20, (), 'search_housings', query)
+        self.process.do(self.app._get_complete_call(20, (), 'search_housings'), query)
 
     def displayBookmarks(self):
         self.ui.housingsList.clear()
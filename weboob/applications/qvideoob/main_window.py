@@ -114,7 +114,7 @@ class MainWindow(QtMainWindow):
             self.process = None
 
         self.process = QtDo(self.weboob, self.addVideo, fb=finished)
-        self.process.do(self.app._do_complete, 20, (), 'search_videos', pattern, self.ui.sortbyEdit.currentIndex(), nsfw=True, backends=backend_name)
+        self.process.do(self.app._get_complete_call(20, (), 'search_videos'), pattern, self.ui.sortbyEdit.currentIndex(), nsfw=True, backends=backend_name)
 
     def addVideo(self, video):
         minivideo = MiniVideo(self.weboob, self.weboob[video.backend], video)
@@ -225,10 +225,9 @@ class MainWindow(QtMainWindow):
                             self._gotRevision,
                             self._errorHistory,
                             finished)
-        self.process.do(self.app._do_complete,
-                        self.ui.nbRevBox.value(),
-                        (),
-                        'iter_revisions',
+        self.process.do(self.app._get_complete_call(self.ui.nbRevBox.value(),
+                                                    (),
+                                                    'iter_revisions'),
                         self.content.id,
                         backends=(self.backend,))
 
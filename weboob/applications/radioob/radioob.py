@@ -22,7 +22,6 @@ from __future__ import print_function
 import subprocess
 import os
 import re
-import requests
 
 from weboob.capabilities.radio import CapRadio, Radio
 from weboob.capabilities.audio import CapAudio, BaseAudio, Playlist, Album
@@ -267,6 +266,7 @@ class Radioob(ReplApplication):
                 if isinstance(stream, BaseAudio) and not stream.url:
                     stream = self.get_object(stream.id, 'get_audio')
                 else:
+                    import requests
                     r = requests.get(stream.url, stream=True)
                     buf = r.iter_content(512).next()
                     r.close()
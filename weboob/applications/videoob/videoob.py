@@ -19,7 +19,6 @@
 
 from __future__ import print_function
 
-import requests
 import subprocess
 import os
 
@@ -121,6 +120,7 @@ class Videoob(ReplApplication):
         os.spawnlp(os.P_WAIT, args[0], *args)
 
     def read_url(self, url):
+        import requests
         r = requests.get(url, stream=True)
         return r.iter_lines()
 
@@ -164,18 +164,18 @@ class WeboobCfg(ReplApplication):
         caps = line.split()
         for instance_name, name, params in sorted(self.weboob.backends_config.iter_backends()):
             try:
-                module = self.weboob.modules_loader.get_or_load_module(name)
+                module = self.weboob.modules_loader.get_module_info(name)
             except ModuleLoadError as e:
                 self.logger.warning('Unable to load module %r: %s' % (name, e))
                 continue
 
             if caps and not module.has_caps(*caps):
                 continue
+            masked = set(key for key, field in module.config if field['masked'])
             row = OrderedDict([('Name', instance_name),
                                ('Module', name),
                                ('Configuration', ', '.join(
-                                   '%s=%s' % (key, ('*****' if key in module.config and module.config[key].masked
-                                                    else value))
+                                   '%s=%s' % (key, ('*****' if key in masked else value))
                                    for key, value in params.iteritems())),
                                ])
             self.format(row)
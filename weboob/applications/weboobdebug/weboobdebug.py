@@ -57,7 +57,8 @@ class WeboobDebug(Application):
             print(u'Unable to load backend "%s"' % backend_name, file=self.stderr)
             return 1
 
-        locs = dict(backend=backend, browser=backend.browser, application=self, weboob=self.weboob)
+        locs = dict(backend=backend, browser=backend.browser, application=self, weboob=self.weboob,
+                    metrics=self.weboob.metrics)
         banner = 'Weboob debug shell\nBackend "%s" loaded.\nAvailable variables:\n' % backend_name \
                  + '\n'.join(['  %s: %s' % (k, v) for k, v in locs.iteritems()])
 
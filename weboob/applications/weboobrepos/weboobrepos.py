@@ -21,6 +21,7 @@ from __future__ import print_function
 
 from datetime import datetime
 from time import mktime, strptime
+import hashlib
 import tarfile
 import os
 import shutil
@@ -36,6 +37,83 @@ from weboob.tools.application.repl import ReplApplication
 __all__ = ['WeboobRepos']
 
 
+def archive_excludes(filename):
+    # Skip *.pyc files in tarballs.
+    if filename.endswith('.pyc'):
+        return True
+    # Don't include *.png files in tarball
+    if filename.endswith('.png'):
+        return True
+    return False
+
+
+def build_archive(name, source_path, repo_path, version):
+    """
+    Create the archive of a module if it is outdated, and copy its icon.
+
+    :returns: SHA-256 checksum of the archive
+    :rtype: :class:`str`
+    """
+    tarname = os.path.join(repo_path, '%s.tar.gz' % name)
+    module_path = os.path.join(source_path, name)
+    if os.path.exists(tarname):
+        tar_mtime = int(datetime.fromtimestamp(os.path.getmtime(tarname)).strftime('%Y%m%d%H%M'))
+    if not os.path.exists(tarname) or tar_mtime < version:
+        print('Create archive for %s' % name)
+        with closing(tarfile.open(tarname, 'w:gz')) as tar:
+            tar.add(module_path, arcname=name, exclude=archive_excludes)
+        tar_mtime = mktime(strptime(str(version), '%Y%m%d%H%M'))
+        os.utime(tarname, (tar_mtime, tar_mtime))
+
+        # Copy icon.
+        icon_path = os.path.join(module_path, 'favicon.png')
+        if os.path.exists(icon_path):
+            shutil.copy(icon_path, os.path.join(repo_path, '%s.png' % name))
+
+    checksum = hashlib.sha256()
+    with open(tarname, 'rb') as fp:
+        for chunk in iter(lambda: fp.read(64 * 1024), b''):
+            checksum.update(chunk)
+    return checksum.hexdigest()
+
+
+def sign_file(gpg, fingerprint, filepath):
+    """
+    Create the detached signature of a file.
+    """
+    sigpath = filepath + '.sig'
+    file_mtime = int(os.path.getmtime(filepath))
+    if os.path.exists(sigpath):
+        os.remove(sigpath)
+    subprocess.check_call([
+        gpg,
+        '--no-options',
+        '--quiet',
+        '--local-user', fingerprint,
+        '--detach-sign',
+        '--output', sigpath,
+        '--sign', filepath])
+    os.utime(sigpath, (file_mtime, file_mtime))
+
+
+def run_task(task):
+    """
+    Call a function in a worker process.
+
+    Exceptions are not always picklable (for example
+    :class:`subprocess.CalledProcessError`), and the pool would wait forever
+    for the result, so they are replaced by a plain :class:`Exception`.
+
+    :param task: function and its arguments
+    :type task: :class:`tuple`
+    """
+    function, args = task
+    try:
+        return function(*args)
+    except Exception as e:
+        raise Exception('%s: %s' % (e.__class__.__name__, e))
+
+
 class WeboobRepos(ReplApplication):
     APPNAME = 'weboob-repos'
     VERSION = '1.1'
@@ -46,6 +124,9 @@ class WeboobRepos(ReplApplication):
                            'list':        'table',
                            }
     DISABLE_REPL = True
+    # number of processes used to build archives and signatures, or None
+    # to use one per CPU
+    BUILD_PROCESSES = None
 
     weboob_commands = copy(ReplApplication.weboob_commands)
     weboob_commands.remove('backends')
@@ -136,26 +217,17 @@ class WeboobRepos(ReplApplication):
             else:
                 print('Keyring is up to date')
 
-        for name, module in r.modules.iteritems():
-            tarname = os.path.join(repo_path, '%s.tar.gz' % name)
+        # Archives are built in a pool of processes.
+        modules = r.modules.values()
+        checksums = self._run_in_processes(build_archive, [(module.name, source_path, repo_path, module.version)
+                                                           for module in modules])
+        for module, checksum in zip(modules, checksums):
             if r.signed:
-                sigfiles.append(os.path.basename(tarname))
-            module_path = os.path.join(source_path, name)
-            if os.path.exists(tarname):
-                tar_mtime = int(datetime.fromtimestamp(os.path.getmtime(tarname)).strftime('%Y%m%d%H%M'))
-                if tar_mtime >= module.version:
-                    continue
-
-            print('Create archive for %s' % name)
-            with closing(tarfile.open(tarname, 'w:gz')) as tar:
-                tar.add(module_path, arcname=name, exclude=self._archive_excludes)
-            tar_mtime = mktime(strptime(str(module.version), '%Y%m%d%H%M'))
-            os.utime(tarname, (tar_mtime, tar_mtime))
+                sigfiles.append('%s.tar.gz' % module.name)
+            # Clients use the checksum to find the archive in their cache.
+            module.sha256 = checksum
 
-            # Copy icon.
-            icon_path = os.path.join(module_path, 'favicon.png')
-            if os.path.exists(icon_path):
-                shutil.copy(icon_path, os.path.join(repo_path, '%s.png' % name))
+        r.save(index_file)
 
         if r.signed:
             # Find out which keys are allowed to sign
@@ -188,6 +260,7 @@ class WeboobRepos(ReplApplication):
                 raise Exception('No suitable secret key found')
 
             # Check if all files have an up to date signature
+            outdated = []
             for filename in sigfiles:
                 filepath = os.path.realpath(os.path.join(repo_path, filename))
                 sigpath = filepath + '.sig'
@@ -196,19 +269,39 @@ class WeboobRepos(ReplApplication):
                     sig_mtime = int(os.path.getmtime(sigpath))
                 if not os.path.exists(sigpath) or sig_mtime < file_mtime:
                     print('Signing %s' % filename)
-                    if os.path.exists(sigpath):
-                        os.remove(sigpath)
-                    subprocess.check_call([
-                        gpg,
-                        '--no-options',
-                        '--quiet',
-                        '--local-user', secret_fingerprint,
-                        '--detach-sign',
-                        '--output', sigpath,
-                        '--sign', filepath])
-                    os.utime(sigpath, (file_mtime, file_mtime))
+                    outdated.append((gpg, secret_fingerprint, filepath))
+            self._run_in_processes(sign_file, outdated)
             print('Signatures are up to date')
 
+    def _run_in_processes(self, function, args_list):
+        """
+        Call a function with every tuple of arguments, in a pool of
+        BUILD_PROCESSES processes.
+
+        :returns: results of calls, in the order of arguments
+        :rtype: :class:`list`
+        """
+        from multiprocessing import Pool, TimeoutError
+        pool = Pool(self.BUILD_PROCESSES)
+        try:
+            result = pool.map_async(run_task, [(function, args) for args in args_list])
+            while True:
+                # wait with a timeout, otherwise KeyboardInterrupt is
+                # ignored until the end
+                try:
+                    results = result.get(1)
+                except TimeoutError:
+                    continue
+                break
+        except BaseException:
+            pool.terminate()
+            raise
+        else:
+            pool.close()
+            return results
+        finally:
+            pool.join()
+
     @staticmethod
     def _find_gpg():
         if os.getenv('GPG_EXECUTABLE'):
@@ -220,11 +313,3 @@ class WeboobRepos(ReplApplication):
                 if os.path.exists(fpath) and os.access(fpath, os.X_OK):
                     return fpath
 
-    def _archive_excludes(self, filename):
-        # Skip *.pyc files in tarballs.
-        if filename.endswith('.pyc'):
-            return True
-        # Don't include *.png files in tarball
-        if filename.endswith('.png'):
-            return True
-        return False
@@ -40,13 +40,14 @@ try:
 except ImportError:
     raise ImportError('Please install python-requests >= 2.0')
 
+from weboob.tools.cancellation import check_cancelled
 from weboob.tools.log import getLogger
 from weboob.tools.ordereddict import OrderedDict
 from weboob.tools.json import json
 
 from .cookies import WeboobCookieJar
 from .exceptions import HTTPNotFound, ClientError, ServerError
-from .sessions import FuturesSession
+from .sessions import FuturesSession, get_shared_adapter
 from .profiles import Firefox
 from .pages import NextPage
 from .url import URL
@@ -88,6 +89,35 @@ class Browser(object):
     Maximum of threads for asynchronous requests.
     """
 
+    RATE_LIMIT = None
+    """
+    Limit requests to hosts: a :class:`weboob.browser.ratelimit.RateLimit` for
+    every host, or a dict associating host names to their limit, where the None
+    key is the limit of other hosts. Limits are shared by every browser of the
+    process.
+    """
+
+    SHARE_CONNECTIONS = False
+    """
+    Use connections opened by other browsers of the process to the same hosts,
+    instead of having its own. Cookies are never shared.
+    """
+
+    HTTP_CACHE = None
+    """
+    Cache responses according to their HTTP headers: True to keep them in
+    memory for each browser, a :class:`weboob.browser.cache.CacheStore` to use
+    a specific store, or None to disable the cache. As a store set on the class
+    is shared between its browsers, private responses and responses to requests
+    with cookies or credentials are then not stored.
+    """
+
+    HTTP_CACHE_TTL = None
+    """
+    Time in seconds during which cached responses without an explicit
+    expiration time are fresh.
+    """
+
     @classmethod
     def asset(cls, localfile):
         """
@@ -181,12 +211,22 @@ class Browser(object):
 
         # defines a max_retries. It's mandatory in case a server is not
         # handling keep alive correctly, like the proxy burp
-        a = requests.adapters.HTTPAdapter(max_retries=self.MAX_RETRIES)
+        if self.SHARE_CONNECTIONS:
+            a = get_shared_adapter(self.MAX_RETRIES, self.MAX_WORKERS, session.verify)
+        else:
+            a = requests.adapters.HTTPAdapter(max_retries=self.MAX_RETRIES)
         session.mount('http://', a)
         session.mount('https://', a)
 
         if self.TIMEOUT:
             session.timeout = self.TIMEOUT
+
+        session.rate_limit = self.RATE_LIMIT
+
+        if self.HTTP_CACHE:
+            from .cache import HTTPCache, MemoryStore
+            store = MemoryStore() if self.HTTP_CACHE is True else self.HTTP_CACHE
+            session.cache = HTTPCache(store, self.HTTP_CACHE_TTL, shared=self.HTTP_CACHE is not True)
         ## weboob only can provide proxy and HTTP auth options
         session.trust_env = False
 
@@ -270,7 +310,11 @@ class Browser(object):
         :type callback: function
 
         :rtype: :class:`requests.Response`
+        :raises: :class:`weboob.exceptions.CallCancelled` if the backend call
+                 running in this thread has been cancelled
         """
+        check_cancelled()
+
         req = self.build_request(url, referrer, data_encoding=data_encoding, **kwargs)
         preq = self.prepare_request(req)
 
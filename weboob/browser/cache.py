@@ -0,0 +1,429 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2016 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+HTTP cache for browsers, following RFC 7234.
+
+Responses to GET requests are stored when the server allows it, and are
+reused as long as they are fresh according to their Cache-Control or
+Expires headers. Stale responses are revalidated with the server, using
+their ETag and Last-Modified headers.
+
+A cache is private to a browser, unless its store is shared between
+browsers: then only public responses are stored.
+"""
+
+import os
+import hashlib
+import tempfile
+import time
+from datetime import timedelta
+from email.utils import parsedate_tz, mktime_tz
+from threading import Lock
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+
+from weboob.tools.log import getLogger
+from weboob.tools.ordereddict import OrderedDict
+
+
+__all__ = ['CacheEntry', 'CacheStore', 'MemoryStore', 'FileStore', 'HTTPCache']
+
+
+def parse_date(value):
+    """
+    Parse a HTTP date to a timestamp, or return None if it is invalid.
+    """
+    if not value:
+        return None
+    date = parsedate_tz(value)
+    if date is None:
+        return None
+    try:
+        return mktime_tz(date)
+    except (OverflowError, ValueError):
+        return None
+
+
+def parse_cache_control(value):
+    """
+    Parse a Cache-Control header to a dict of directives.
+    """
+    directives = {}
+    for directive in (value or '').split(','):
+        name, _, arg = directive.strip().partition('=')
+        if name:
+            directives[name.lower()] = arg.strip('"') or None
+    return directives
+
+
+class CacheEntry(object):
+    """
+    Response stored in the cache.
+    """
+
+    def __init__(self, response, vary=None):
+        self.url = response.url
+        self.status_code = response.status_code
+        self.reason = response.reason
+        self.headers = dict(response.headers)
+        self.encoding = response.encoding
+        self.content = response.content
+        # values of the request headers listed by the Vary header
+        self.vary = vary or {}
+        self.response_time = time.time()
+
+    @property
+    def size(self):
+        return len(self.content)
+
+    def update(self, response):
+        """
+        Update the entry with the headers of a 304 response.
+        """
+        for key, value in response.headers.iteritems():
+            if key.lower() not in ('content-length', 'content-encoding', 'transfer-encoding'):
+                self.headers[key] = value
+        self.response_time = time.time()
+
+    def build_response(self, request):
+        """
+        Get a :class:`requests.Response` object from this entry.
+        """
+        response = Response()
+        response.url = self.url
+        response.status_code = self.status_code
+        response.reason = self.reason
+        response.headers = CaseInsensitiveDict(self.headers)
+        response.encoding = self.encoding
+        response._content = self.content
+        response._content_consumed = True
+        response.request = request
+        response.elapsed = timedelta(0)
+        response.from_cache = True
+        return response
+
+
+class CacheStore(object):
+    """
+    Storage of cache entries.
+
+    Stores evict the least recently used entries once their size exceeds
+    a limit.
+    """
+
+    def get(self, key):
+        """
+        Get an entry, or None if it is not stored.
+        """
+        raise NotImplementedError()
+
+    def set(self, key, entry):
+        raise NotImplementedError()
+
+    def delete(self, key):
+        raise NotImplementedError()
+
+
+class MemoryStore(CacheStore):
+    """
+    Store entries in memory.
+
+    :param max_size: maximum size of the content of entries, in bytes
+    :type max_size: :class:`int`
+    """
+
+    def __init__(self, max_size=10 * 1024 * 1024):
+        self.max_size = max_size
+        self.size = 0
+        self.entries = OrderedDict()
+        self.mutex = Lock()
+
+    def get(self, key):
+        with self.mutex:
+            entry = self.entries.pop(key, None)
+            if entry is not None:
+                # mark it as the most recently used
+                self.entries[key] = entry
+            return entry
+
+    def set(self, key, entry):
+        with self.mutex:
+            self._delete(key)
+            if entry.size > self.max_size:
+                return
+            self.entries[key] = entry
+            self.size += entry.size
+            while self.size > self.max_size:
+                self._delete(next(iter(self.entries)))
+
+    def delete(self, key):
+        with self.mutex:
+            self._delete(key)
+
+    def _delete(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry.size
+
+
+class FileStore(CacheStore):
+    """
+    Store entries in files of a directory.
+
+    The modification time of a file is its last use.
+
+    :param path: directory of the cache
+    :type path: :class:`str`
+    :param max_size: maximum size of files, in bytes
+    :type max_size: :class:`int`
+    """
+
+    def __init__(self, path, max_size=100 * 1024 * 1024):
+        self.path = path
+        self.max_size = max_size
+        self.logger = getLogger('cache')
+        self.mutex = Lock()
+
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        self.size = sum(os.path.getsize(filename) for filename in self._iter_files())
+
+    def _iter_files(self):
+        for name in os.listdir(self.path):
+            yield os.path.join(self.path, name)
+
+    def _get_filename(self, key):
+        if isinstance(key, unicode):
+            key = key.encode('utf-8')
+        return os.path.join(self.path, hashlib.sha1(key).hexdigest())
+
+    def get(self, key):
+        filename = self._get_filename(key)
+        try:
+            with open(filename, 'rb') as f:
+                entry = pickle.load(f)
+            os.utime(filename, None)
+        except (IOError, OSError):
+            return None
+        except Exception as e:
+            self.logger.warning('Unable to read the cache entry of %s: %s' % (key, e))
+            return None
+        return entry
+
+    def set(self, key, entry):
+        try:
+            # write in a temporary file to avoid corruption problems
+            with tempfile.NamedTemporaryFile(dir=self.path, prefix='.', delete=False) as f:
+                pickle.dump(entry, f, pickle.HIGHEST_PROTOCOL)
+            size = os.path.getsize(f.name)
+            with self.mutex:
+                self._delete(key)
+                os.rename(f.name, self._get_filename(key))
+                self.size += size
+                if self.size > self.max_size:
+                    self._evict()
+        except (IOError, OSError) as e:
+            self.logger.warning('Unable to save the cache entry of %s: %s' % (key, e))
+
+    def delete(self, key):
+        with self.mutex:
+            self._delete(key)
+
+    def _delete(self, key):
+        filename = self._get_filename(key)
+        try:
+            size = os.path.getsize(filename)
+            os.remove(filename)
+        except OSError:
+            pass
+        else:
+            self.size -= size
+
+    def _evict(self):
+        files = []
+        for filename in self._iter_files():
+            if os.path.basename(filename).startswith('.'):
+                continue
+            try:
+                st = os.stat(filename)
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, filename))
+
+        self.size = sum(size for _, size, _ in files)
+        for _, size, filename in sorted(files):
+            if self.size <= self.max_size:
+                break
+            try:
+                os.remove(filename)
+            except OSError:
+                pass
+            self.size -= size
+
+
+class HTTPCache(object):
+    """
+    Cache of HTTP responses.
+
+    :param store: storage of entries
+    :type store: :class:`CacheStore`
+    :param default_ttl: freshness lifetime, in seconds, of responses without
+                        explicit expiration time, or None to use the heuristic
+                        of RFC 7234 based on the Last-Modified header
+    :type default_ttl: :class:`int`
+    :param shared: if True, the store is shared between browsers, which may
+                   be logged in different accounts, so responses which are
+                   private or depend on credentials or cookies are not stored
+    :type shared: :class:`bool`
+    """
+
+    # status codes of responses which are stored
+    CACHEABLE_STATUS = (200, 203)
+
+    def __init__(self, store, default_ttl=None, shared=False):
+        self.store = store
+        self.default_ttl = default_ttl
+        self.shared = shared
+
+    @staticmethod
+    def get_key(request):
+        return '%s %s' % (request.method, request.url)
+
+    def get(self, request):
+        """
+        Get the entry for a request, or None if it has to be sent.
+        """
+        if request.method != 'GET' or 'no-store' in parse_cache_control(request.headers.get('Cache-Control')):
+            return None
+
+        entry = self.store.get(self.get_key(request))
+        if entry is None:
+            return None
+
+        for header, value in entry.vary.iteritems():
+            if request.headers.get(header) != value:
+                return None
+        return entry
+
+    def is_fresh(self, entry, request):
+        """
+        Check if an entry can be used without revalidation.
+        """
+        request_cc = parse_cache_control(request.headers.get('Cache-Control'))
+        response_cc = parse_cache_control(entry.headers.get('Cache-Control'))
+        if 'no-cache' in request_cc or 'no-cache' in response_cc or \
+           'no-cache' in entry.headers.get('Pragma', ''):
+            return False
+
+        lifetime = self.get_freshness_lifetime(entry, response_cc)
+        if request_cc.get('max-age', '').isdigit():
+            lifetime = min(lifetime, int(request_cc['max-age']))
+        return self.get_age(entry) < lifetime
+
+    def get_freshness_lifetime(self, entry, cache_control):
+        if self.shared and cache_control.get('s-maxage', '').isdigit():
+            return int(cache_control['s-maxage'])
+        if cache_control.get('max-age', '').isdigit():
+            return int(cache_control['max-age'])
+
+        date = parse_date(entry.headers.get('Date')) or entry.response_time
+        if 'Expires' in entry.headers:
+            expires = parse_date(entry.headers['Expires'])
+            if expires is None:
+                # invalid dates represent a time in the past
+                return 0
+            return expires - date
+
+        if self.default_ttl is not None:
+            return self.default_ttl
+
+        last_modified = parse_date(entry.headers.get('Last-Modified'))
+        if last_modified is not None:
+            return max(0, (date - last_modified) / 10)
+        return 0
+
+    def get_age(self, entry):
+        date = parse_date(entry.headers.get('Date')) or entry.response_time
+        age = entry.headers.get('Age', '')
+        age = int(age) if age.isdigit() else 0
+        apparent_age = max(0, entry.response_time - date)
+        return max(apparent_age, age) + time.time() - entry.response_time
+
+    @staticmethod
+    def add_conditions(entry, request):
+        """
+        Add headers to a request to revalidate an entry.
+        """
+        if 'ETag' in entry.headers:
+            request.headers['If-None-Match'] = entry.headers['ETag']
+        if 'Last-Modified' in entry.headers:
+            request.headers['If-Modified-Since'] = entry.headers['Last-Modified']
+
+    def revalidated(self, entry, request, response):
+        """
+        Update an entry after a 304 response.
+        """
+        entry.update(response)
+        self.store.set(self.get_key(request), entry)
+
+    @staticmethod
+    def is_public(request, response, cache_control):
+        """
+        Check if a response can be given to other browsers than the one which
+        received it.
+        """
+        if 'private' in cache_control or 'Set-Cookie' in response.headers or \
+           'Cookie' in request.headers:
+            return False
+        if 'Authorization' in request.headers:
+            # RFC 7234, section 3.2
+            return 'public' in cache_control or 's-maxage' in cache_control or \
+                   'must-revalidate' in cache_control
+        return True
+
+    def save(self, request, response):
+        """
+        Store the response to a request, if it is allowed.
+        """
+        if request.method != 'GET' or response.status_code not in self.CACHEABLE_STATUS or response.history:
+            return
+
+        key = self.get_key(request)
+        request_cc = parse_cache_control(request.headers.get('Cache-Control'))
+        response_cc = parse_cache_control(response.headers.get('Cache-Control'))
+        vary = [header.strip() for header in response.headers.get('Vary', '').split(',') if header.strip()]
+        if 'no-store' in request_cc or 'no-store' in response_cc or '*' in vary or \
+           self.shared and not self.is_public(request, response, response_cc):
+            self.store.delete(key)
+            return
+
+        entry = CacheEntry(response, dict((header, request.headers.get(header)) for header in vary))
+        if 'ETag' not in entry.headers and 'Last-Modified' not in entry.headers and \
+           self.get_freshness_lifetime(entry, response_cc) <= 0:
+            # it would never be used
+            self.store.delete(key)
+            return
+
+        self.store.set(key, entry)
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2016 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Rate limiting of requests to hosts, shared by every browser of the process.
+"""
+
+from threading import Lock, Semaphore
+from time import time
+try:
+    from urllib.parse import urlparse
+except ImportError:
+    from urlparse import urlparse
+
+from weboob.exceptions import CallCancelled
+from weboob.tools.cancellation import sleep
+
+
+__all__ = ['RateLimit', 'TokenBucket', 'get_bucket']
+
+
+class RateLimit(object):
+    """
+    Limits of requests to a host.
+
+    :param rate: maximum number of requests per second, or None for no limit
+    :type rate: :class:`float`
+    :param burst: number of requests which can be done at once after an
+                  idle period
+    :type burst: :class:`int`
+    :param concurrency: maximum number of requests running at the same time,
+                        or None for no limit
+    :type concurrency: :class:`int`
+    """
+
+    def __init__(self, rate=None, burst=1, concurrency=None):
+        if rate is not None and rate <= 0:
+            raise ValueError('The rate must be positive')
+        if burst < 1:
+            raise ValueError('The burst must be at least 1')
+        self.rate = rate
+        self.burst = burst
+        self.concurrency = concurrency
+
+    def __eq__(self, other):
+        return isinstance(other, RateLimit) and self.key == other.key
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.key)
+
+    @property
+    def key(self):
+        return (self.rate, self.burst, self.concurrency)
+
+    def __repr__(self):
+        return '<RateLimit rate=%r burst=%r concurrency=%r>' % self.key
+
+
+class TokenBucket(object):
+    """
+    Token bucket which enforces a :class:`RateLimit`.
+
+    It is used as a context manager around a request: entering waits for a
+    token and for a free slot, and exiting frees the slot. Waiting for a
+    token stops with :class:`weboob.exceptions.CallCancelled` if the call
+    running in the current thread is cancelled.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.mutex = Lock()
+        self.tokens = float(limit.burst)
+        self.last = time()
+        self.semaphore = Semaphore(limit.concurrency) if limit.concurrency else None
+
+    def acquire(self):
+        if self.limit.rate is not None:
+            with self.mutex:
+                now = time()
+                self.tokens = min(self.limit.burst, self.tokens + (now - self.last) * self.limit.rate)
+                self.last = now
+                # Tokens can be reserved in advance, so waiting threads are
+                # served in order.
+                self.tokens -= 1
+                delay = -self.tokens / self.limit.rate
+            if delay > 0:
+                try:
+                    sleep(delay)
+                except CallCancelled:
+                    # the token is not used
+                    with self.mutex:
+                        self.tokens += 1
+                    raise
+
+        if self.semaphore is not None:
+            self.semaphore.acquire()
+
+    def release(self):
+        if self.semaphore is not None:
+            self.semaphore.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, t, v, tb):
+        self.release()
+
+
+buckets = {}
+buckets_mutex = Lock()
+
+
+def get_bucket(url, limits):
+    """
+    Get the bucket of the host of an URL.
+
+    Buckets are shared by every browser of the process with the same limit
+    for a host.
+
+    :param url: URL of the request
+    :type url: :class:`str`
+    :param limits: limit for every host, or dict of limits per host name,
+                   where the None key is the limit of other hosts
+    :type limits: :class:`RateLimit` or :class:`dict`
+    :returns: the bucket, or None if the host is not limited
+    :rtype: :class:`TokenBucket`
+    """
+    host = urlparse(url).hostname
+    if isinstance(limits, dict):
+        limit = limits.get(host, limits.get(None))
+    else:
+        limit = limits
+    if limit is None:
+        return None
+
+    key = (host, limit)
+    with buckets_mutex:
+        if key not in buckets:
+            buckets[key] = TokenBucket(limit)
+        return buckets[key]
@@ -20,6 +20,7 @@
 # Inspired by: https://github.com/ross/requests-futures/blob/master/requests_futures/sessions.py
 # XXX Licence issues?
 
+from threading import Lock
 try:
     from concurrent.futures import ThreadPoolExecutor
 except ImportError:
@@ -58,7 +59,147 @@ def merge_hooks(request_hooks, session_hooks, dict_class=OrderedDict):
     return ret
 
 
+class SharedHTTPAdapter(HTTPAdapter):
+    """
+    HTTP adapter used by several sessions.
+
+    urllib3 keeps its pools of connections per scheme, host and proxy, so
+    sessions using it reuse the connections opened by others, but still have
+    their own cookies. Closing a session does not close these connections.
+
+    As requests sets the verification of certificates and the client
+    certificate on pools of connections, requests which do not use the ones
+    of the adapter are sent by the shared adapter which does.
+    """
+
+    # (max_retries, pool_maxsize, verify, cert) given to get_shared_adapter()
+    key = None
+
+    def send(self, request, **kwargs):
+        max_retries, pool_maxsize, verify, cert = self.key
+        if kwargs.get('verify', True) != verify or kwargs.get('cert') != cert:
+            adapter = get_shared_adapter(max_retries, pool_maxsize, kwargs.get('verify', True), kwargs.get('cert'))
+            return adapter.send(request, **kwargs)
+        return super(SharedHTTPAdapter, self).send(request, **kwargs)
+
+    def close(self):
+        pass
+
+
+shared_adapters = {}
+shared_adapters_mutex = Lock()
+
+
+def get_shared_adapter(max_retries=0, pool_maxsize=DEFAULT_POOLSIZE, verify=True, cert=None):
+    """
+    Get the adapter shared by sessions of the whole process with the same
+    configuration.
+
+    As requests sets the verification of certificates and the client
+    certificate on pools of connections, the adapter is not shared between
+    sessions which do not use the same ones.
+
+    :param max_retries: maximum number of retries of a request
+    :type max_retries: :class:`int`
+    :param pool_maxsize: maximum number of connections kept alive per host
+    :type pool_maxsize: :class:`int`
+    :param verify: verification of certificates, as the `verify` attribute of sessions
+    :type verify: :class:`bool` or :class:`str`
+    :param cert: client certificate, as the `cert` attribute of sessions
+    :type cert: :class:`str` or :class:`tuple`
+    :rtype: :class:`SharedHTTPAdapter`
+    """
+    key = (max_retries, pool_maxsize, verify, cert)
+    with shared_adapters_mutex:
+        if key not in shared_adapters:
+            # keep connections to more hosts than the default, as the
+            # adapter is used for every host of every backend
+            adapter = SharedHTTPAdapter(pool_connections=100,
+                                        pool_maxsize=pool_maxsize,
+                                        max_retries=max_retries)
+            adapter.key = key
+            shared_adapters[key] = adapter
+        return shared_adapters[key]
+
+
+class RateLimitedAdapter(object):
+    """
+    Wrapper of an adapter which sends requests once allowed by a
+    :class:`weboob.browser.ratelimit.TokenBucket`.
+    """
+
+    def __init__(self, adapter, bucket):
+        self.adapter = adapter
+        self.bucket = bucket
+
+    def send(self, request, **kwargs):
+        """
+        Send a request once allowed by the bucket.
+
+        The concurrency slot of the bucket is only held while sending: with
+        ``stream=True``, it is released once the headers are received, so
+        the download of the body is not limited.
+        """
+        with self.bucket:
+            return self.adapter.send(request, **kwargs)
+
+    def close(self):
+        self.adapter.close()
+
+
 class WeboobSession(Session):
+    cache = None
+    """
+    :class:`weboob.browser.cache.HTTPCache` used by requests, if any.
+    """
+
+    rate_limit = None
+    """
+    Limits of requests to hosts, see :func:`weboob.browser.ratelimit.get_bucket`.
+    """
+
+    def get_adapter(self, url):
+        """Returns the appropriate connection adapter for the given URL,
+        limiting its rate if needed.
+
+        As requests only sends requests through the adapter, each redirection
+        is limited, but responses from the cache are not.
+        """
+        adapter = super(WeboobSession, self).get_adapter(url)
+        if self.rate_limit is not None:
+            from .ratelimit import get_bucket
+            bucket = get_bucket(url, self.rate_limit)
+            if bucket is not None:
+                return RateLimitedAdapter(adapter, bucket)
+        return adapter
+
+    def send(self, request, **kwargs):
+        """Send a given PreparedRequest, using the HTTP cache if it
+        is enabled.
+
+        Streamed responses are never cached.
+        """
+        if self.cache is None or kwargs.get('stream'):
+            return super(WeboobSession, self).send(request, **kwargs)
+
+        entry = self.cache.get(request)
+        if entry is not None:
+            if self.cache.is_fresh(entry, request):
+                return entry.build_response(request)
+
+            original = request
+            request = request.copy()
+            self.cache.add_conditions(entry, request)
+
+        response = super(WeboobSession, self).send(request, **kwargs)
+        if entry is not None and response.status_code == 304:
+            self.cache.revalidated(entry, original, response)
+            response.close()
+            return entry.build_response(original)
+
+        self.cache.save(request, response)
+        return response
+
     def prepare_request(self, request):
         """Constructs a :class:`PreparedRequest <PreparedRequest>` for
         transmission and returns it. The :class:`PreparedRequest` has settings
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+# Copyright(C) 2016 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+import shutil
+import tempfile
+from io import BytesIO
+from unittest import TestCase
+
+from requests.adapters import BaseAdapter
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+
+from weboob.browser import Browser
+from weboob.browser.cache import CacheEntry, FileStore, MemoryStore
+from weboob.browser.exceptions import ServerError
+
+
+# Mock that answers requests with the responses of a dict
+class MockAdapter(BaseAdapter):
+    def __init__(self, pages):
+        super(MockAdapter, self).__init__()
+        self.pages = pages
+        self.requests = []
+
+    def send(self, request, **kwargs):
+        self.requests.append(request)
+        status, headers, content = self.pages[request.url]
+        if request.headers.get('If-None-Match') and request.headers['If-None-Match'] == headers.get('ETag'):
+            status, content = 304, ''
+
+        response = Response()
+        response.status_code = status
+        response.headers = CaseInsensitiveDict(headers)
+        response.raw = BytesIO(content)
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+# Mock that allows to represent a Browser with a cache
+class MockBrowser(Browser):
+    HTTP_CACHE = True
+
+
+# Mock that allows to represent Browsers sharing a cache
+class MockSharedBrowser(Browser):
+    HTTP_CACHE = MemoryStore()
+
+
+# Class that tests the HTTP cache of browsers
+class HTTPCacheTest(TestCase):
+
+    def setUp(self):
+        self.browser = MockBrowser()
+        self.adapter = MockAdapter({
+            'http://example.org/fresh': (200, {'Cache-Control': 'max-age=3600'}, 'fresh'),
+            'http://example.org/etag': (200, {'Cache-Control': 'no-cache', 'ETag': '"1"'}, 'etag'),
+            'http://example.org/nostore': (200, {'Cache-Control': 'no-store, max-age=3600'}, 'nostore'),
+            'http://example.org/error': (500, {'Cache-Control': 'max-age=3600'}, 'error'),
+        })
+        self.browser.session.mount('http://', self.adapter)
+
+    def test_fresh(self):
+        self.assertEqual(self.browser.open('http://example.org/fresh').text, 'fresh')
+        response = self.browser.open('http://example.org/fresh')
+        self.assertEqual(response.text, 'fresh')
+        self.assertTrue(response.from_cache)
+        self.assertEqual(len(self.adapter.requests), 1)
+
+    def test_revalidation(self):
+        self.browser.open('http://example.org/etag')
+        response = self.browser.open('http://example.org/etag')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.text, 'etag')
+        self.assertEqual(len(self.adapter.requests), 2)
+        self.assertEqual(self.adapter.requests[1].headers['If-None-Match'], '"1"')
+
+    def test_not_stored(self):
+        self.browser.open('http://example.org/nostore')
+        self.browser.open('http://example.org/nostore')
+        self.assertEqual(len(self.adapter.requests), 2)
+
+        for _ in xrange(2):
+            self.assertRaises(ServerError, self.browser.open, 'http://example.org/error')
+        self.assertEqual(len(self.adapter.requests), 4)
+
+    def test_default_ttl(self):
+        self.browser.session.cache.default_ttl = 3600
+        self.adapter.pages['http://example.org/ttl'] = (200, {}, 'ttl')
+        self.browser.open('http://example.org/ttl')
+        self.assertTrue(self.browser.open('http://example.org/ttl').from_cache)
+
+    def test_shared(self):
+        pages = {
+            'http://example.org/public': (200, {'Cache-Control': 'max-age=3600'}, 'public'),
+            'http://example.org/private': (200, {'Cache-Control': 'private, max-age=3600'}, 'private'),
+            'http://example.org/setcookie': (200, {'Cache-Control': 'max-age=3600', 'Set-Cookie': 'a=1'}, 'cookie'),
+        }
+        browsers = [MockSharedBrowser(), MockSharedBrowser()]
+        adapter = MockAdapter(pages)
+        for browser in browsers:
+            browser.session.mount('http://', adapter)
+
+        for url in sorted(pages):
+            browsers[0].open(url)
+            browsers[1].open(url)
+        self.assertEqual([request.url for request in adapter.requests],
+                         ['http://example.org/private', 'http://example.org/private',
+                          'http://example.org/public',
+                          'http://example.org/setcookie', 'http://example.org/setcookie'])
+
+        # responses to requests with credentials or cookies are not stored
+        for name, headers in (('auth', {'Authorization': 'Basic Zm9vOmJhcg=='}), ('cookie', {'Cookie': 'a=1'})):
+            url = 'http://example.org/%s' % name
+            pages[url] = (200, {'Cache-Control': 'max-age=3600'}, name)
+            browsers[0].open(url, headers=headers)
+            browsers[1].open(url)
+        self.assertEqual(len(adapter.requests), 9)
+
+
+# Mock that allows to represent a response stored in a cache
+class MockEntry(CacheEntry):
+    def __init__(self, content):
+        self.content = content
+
+
+# Class that tests the eviction of entries from stores
+class CacheStoreTest(TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_memory_store(self):
+        store = MemoryStore(max_size=10)
+        store.set('a', MockEntry('aaaa'))
+        store.set('b', MockEntry('bbbb'))
+        store.get('a')
+        store.set('c', MockEntry('cccc'))
+        self.assertEqual(store.get('b'), None)
+        self.assertEqual(store.get('a').content, 'aaaa')
+        self.assertEqual(store.get('c').content, 'cccc')
+        self.assertEqual(store.size, 8)
+
+    def test_file_store(self):
+        store = FileStore(self.path)
+        store.set('a', MockEntry('aaaa'))
+        store = FileStore(self.path)
+        self.assertEqual(store.get('a').content, 'aaaa')
+
+        store.max_size = store.size
+        store.set('b', MockEntry('bbbb'))
+        self.assertEqual(store.get('a'), None)
+        self.assertEqual(store.get('b').content, 'bbbb')
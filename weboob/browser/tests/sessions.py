@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+# Copyright(C) 2016 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+import time
+from threading import Event, Timer
+from unittest import TestCase
+
+from weboob.browser import Browser
+from weboob.browser.ratelimit import RateLimit, TokenBucket, get_bucket
+from weboob.browser.sessions import RateLimitedAdapter, get_shared_adapter
+from weboob.exceptions import CallCancelled
+from weboob.tools.cancellation import cancellable
+
+
+# Mock that allows to represent a Browser sharing its connections
+class MockSharingBrowser(Browser):
+    SHARE_CONNECTIONS = True
+
+
+# Mock that allows to represent a Browser which does not verify certificates
+class MockInsecureBrowser(MockSharingBrowser):
+    VERIFY = False
+
+
+# Mock that allows to represent a Browser limiting requests to a host
+class MockLimitedBrowser(Browser):
+    RATE_LIMIT = {'example.org': RateLimit(rate=10, burst=2)}
+
+
+# Class that tests the connections shared between browsers
+class SharedConnectionsTest(TestCase):
+
+    def test_shared_adapter(self):
+        b1 = MockSharingBrowser()
+        b2 = MockSharingBrowser()
+        self.assertIs(b1.session.get_adapter('https://'), b2.session.get_adapter('https://'))
+        self.assertIsNot(b1.session.cookies, b2.session.cookies)
+
+        self.assertIsNot(Browser().session.get_adapter('https://'), b1.session.get_adapter('https://'))
+        self.assertIsNot(MockInsecureBrowser().session.get_adapter('https://'), b1.session.get_adapter('https://'))
+
+    def test_tls_settings(self):
+        adapter = MockSharingBrowser().session.get_adapter('https://')
+        insecure = get_shared_adapter(Browser.MAX_RETRIES, Browser.MAX_WORKERS, False)
+        self.assertIsNot(insecure, adapter)
+
+        # requests which do not verify certificates are sent by the adapter
+        # which does not verify them
+        sent = []
+        insecure.send = lambda request, **kwargs: sent.append(kwargs)
+        try:
+            adapter.send(None, verify=False)
+        finally:
+            del insecure.send
+        self.assertEqual(sent, [{'verify': False}])
+
+    def test_close(self):
+        b1 = MockSharingBrowser()
+        adapter = b1.session.get_adapter('http://')
+        pool = adapter.poolmanager.connection_from_url('http://example.org/')
+        b1.session.close()
+        self.assertIs(adapter.poolmanager.connection_from_url('http://example.org/'), pool)
+
+
+# Class that tests the rate limiting of requests
+class RateLimitTest(TestCase):
+
+    def test_token_bucket(self):
+        bucket = TokenBucket(RateLimit(rate=20, burst=2))
+        start = time.time()
+        for _ in xrange(6):
+            with bucket:
+                pass
+        # the two first requests are done at once
+        self.assertGreaterEqual(time.time() - start, 0.2)
+
+    def test_cancelled_bucket(self):
+        bucket = TokenBucket(RateLimit(rate=1, burst=1))
+        with bucket:
+            pass
+        cancelled = Event()
+        Timer(0.1, cancelled.set).start()
+        start = time.time()
+        with cancellable(cancelled):
+            with self.assertRaises(CallCancelled):
+                bucket.acquire()
+        self.assertLess(time.time() - start, 0.5)
+        # the token reserved by the cancelled request is given back
+        self.assertGreater(bucket.tokens, -0.5)
+
+    def test_shared_bucket(self):
+        b1 = MockLimitedBrowser()
+        b2 = MockLimitedBrowser()
+        adapter = b1.session.get_adapter('https://example.org/')
+        self.assertIsInstance(adapter, RateLimitedAdapter)
+        self.assertIs(adapter.bucket, b2.session.get_adapter('http://example.org/foo').bucket)
+        self.assertNotIsInstance(b1.session.get_adapter('https://example.com/'), RateLimitedAdapter)
+        self.assertIsNot(get_bucket('https://example.org/', RateLimit(rate=5)), adapter.bucket)
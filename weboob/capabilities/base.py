@@ -115,6 +115,10 @@ class NotAvailableType(object):
     def __deepcopy__(self, memo):
         return self
 
+    def __reduce__(self):
+        # unpickle as the singleton
+        return 'NotAvailable'
+
     def __repr__(self):
         return 'NotAvailable'
 
@@ -144,6 +148,10 @@ class NotLoadedType(object):
     def __deepcopy__(self, memo):
         return self
 
+    def __reduce__(self):
+        # unpickle as the singleton
+        return 'NotLoaded'
+
     def __repr__(self):
         return u'NotLoaded'
 
@@ -20,7 +20,6 @@
 
 from .base import Capability, BaseObject, StringField, IntField, Field, empty
 
-import lxml.etree as ET
 
 import base64
 import re
@@ -86,6 +85,7 @@ class Recipe(BaseObject):
 <krecipes-recipe id='1'>
 </krecipes-recipe>
 </krecipes>'''
+        import lxml.etree as ET
         doc = ET.fromstring(initial_xml)
         recipe = doc.find('krecipes-recipe')
         desc = ET.SubElement(recipe, 'krecipes-description')
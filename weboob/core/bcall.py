@@ -18,19 +18,23 @@
 # along with weboob. If not, see <http://www.gnu.org/licenses/>.
 
 
+import time
 from copy import copy
-from threading import Thread
+from threading import Thread, Lock, Event, Semaphore, Condition, current_thread, _MainThread
 try:
     import Queue
 except ImportError:
     import queue as Queue
 
 from weboob.capabilities.base import BaseObject
+from weboob.core.workers import WorkerPool
+from weboob.exceptions import CallCancelled
+from weboob.tools.cancellation import cancellable
 from weboob.tools.misc import get_backtrace
 from weboob.tools.log import getLogger
 
 
-__all__ = ['BackendsCall', 'CallErrors']
+__all__ = ['BackendsCall', 'CallErrors', 'CallTimeout', 'CoalescedCall', 'SharedCall']
 
 
 class CallErrors(Exception):
@@ -46,46 +50,161 @@ class CallErrors(Exception):
         return self.errors.__iter__()
 
 
+class CallTimeout(Exception):
+    """
+    Reported in :class:`CallErrors` for backends which did not finish before
+    the deadline of a call.
+    """
+
+
 class BackendsCall(object):
+    # Put in the responses queue when a backend has finished.
+    FINISHED = object()
+    # Maximum time to block in the main thread before looping, so that
+    # waiting for responses is still interruptible by a KeyboardInterrupt.
+    MAIN_THREAD_TIMEOUT = 1
+
+    _default_pool = None
+    _default_pool_mutex = Lock()
+
     def __init__(self, backends, function, *args, **kwargs):
         """
         :param backends: List of backends to call
         :type backends: list[:class:`Module`]
         :param function: backends' method name, or callable object.
         :type function: :class:`str` or :class:`callable`
+
+        Other arguments are given to the function, except these keyword
+        arguments which configure the call:
+
+        :param pool: pool of threads in which backends are called; if not
+                     specified, a pool shared by the whole process is used
+        :type pool: :class:`weboob.core.workers.WorkerPool`
+        :param timeout: if specified, maximum number of seconds to wait for
+                        backends; the late ones are reported with a
+                        :class:`CallTimeout` error, and are cancelled
+        :type timeout: :class:`float`
+        :param queue_size: if specified, maximum number of results waiting to
+                           be consumed; backends block when it is reached,
+                           so results have to be consumed by iterating on this
+                           object or with :func:`callback_thread`
+        :type queue_size: :class:`int`
+        :param processes: if specified, backends it accepts are called in
+                          their worker process
+        :type processes: :class:`weboob.core.processes.ProcessPool`
+        :param metrics: if specified, registry where calls are recorded
+        :type metrics: :class:`weboob.core.metrics.MetricsRegistry`
         """
+        pool = kwargs.pop('pool', None)
+        timeout = kwargs.pop('timeout', None)
+        queue_size = kwargs.pop('queue_size', 0)
+        processes = kwargs.pop('processes', None)
+        metrics = kwargs.pop('metrics', None)
+
         self.logger = getLogger('bcall')
 
         self.responses = Queue.Queue()
+        self.slots = Semaphore(queue_size) if queue_size else None
         self.errors = []
-        self.tasks = Queue.Queue()
+        self.mutex = Lock()
+        self.running = list(backends)
+        self.late = set()
+        self.finished = Event()
+        self.cancelled = Event()
+        # set when the call is cancelled for a backend, which can be because
+        # it did not finish before the deadline
+        self.backend_cancelled = dict((backend, Event()) for backend in backends)
+        self.pending = len(backends)
+        self.timeout = timeout
+        self.processes = processes
+        self.metrics = metrics
+        if isinstance(function, basestring):
+            self.method = function
+        else:
+            self.method = getattr(function, '__name__', repr(function))
+        self.deadline = None if timeout is None else time.time() + timeout
+
+        if pool is None:
+            pool = self.get_default_pool()
+        self.pool = pool
 
+        if not backends:
+            self.finished.set()
         for backend in backends:
-            Thread(target=self.backend_process, args=(function, args, kwargs)).start()
-            self.tasks.put(backend)
+            pool.submit(self.backend_process, backend, function, args, kwargs)
+
+    @classmethod
+    def get_default_pool(cls):
+        with cls._default_pool_mutex:
+            if cls._default_pool is None:
+                cls._default_pool = WorkerPool(name='bcall')
+            return cls._default_pool
+
+    def _is_dropped(self, backend):
+        return backend in self.late or self.cancelled.is_set()
 
     def store_result(self, backend, result):
-        if result is None:
+        if result is None or self._is_dropped(backend):
             return
 
         if isinstance(result, BaseObject):
             result.backend = backend.name
+
+        if self.slots is not None:
+            # Block until the consumer catches up.
+            self.slots.acquire()
+            if self._is_dropped(backend):
+                return
         self.responses.put(result)
 
-    def backend_process(self, function, args, kwargs):
-        backend = self.tasks.get()
-        with backend:
+    def _release_slots(self, count):
+        # Wake up the backends blocked in store_result(), as their results are
+        # not expected anymore.
+        if self.slots is not None:
+            for _ in xrange(count):
+                self.slots.release()
+
+    def store_error(self, backend, error, backtrace):
+        with self.mutex:
+            if backend not in self.late:
+                self.errors.append((backend, error, backtrace))
+
+    def backend_process(self, backend, function, args, kwargs):
+        cancelled = self.backend_cancelled[backend]
+        with backend, cancellable(cancelled):
+            start = time.time()
+            stats = {'results': 0, 'first_result_time': None, 'error_class': None}
+
+            def store(result):
+                if result is not None:
+                    stats['results'] += 1
+                    if stats['first_result_time'] is None:
+                        stats['first_result_time'] = time.time() - start
+                self.store_result(backend, result)
+
+            def error(error, backtrace):
+                stats['error_class'] = error.__class__.__name__
+                self.store_error(backend, error, backtrace)
+
             try:
+                if cancelled.is_set():
+                    self.logger.debug('%s: Call of function %s is cancelled', backend, function)
+                    return
+
                 # Call method on backend
                 try:
                     self.logger.debug('%s: Calling function %s', backend, function)
-                    if callable(function):
+                    if self.processes is not None and self.processes.accepts(backend):
+                        result = self.processes.call(backend, function, args, kwargs)
+                    elif callable(function):
                         result = function(backend, *args, **kwargs)
                     else:
                         result = getattr(backend, function)(*args, **kwargs)
-                except Exception as error:
-                    self.logger.debug('%s: Called function %s raised an error: %r', backend, function, error)
-                    self.errors.append((backend, error, get_backtrace(error)))
+                except CallCancelled:
+                    self.logger.debug('%s: Call of function %s is cancelled', backend, function)
+                except Exception as e:
+                    self.logger.debug('%s: Called function %s raised an error: %r', backend, function, e)
+                    error(e, get_backtrace(e))
                 else:
                     self.logger.debug('%s: Called function %s returned: %r', backend, function, result)
 
@@ -93,23 +212,98 @@ class BackendsCall(object):
                         # Loop on iterator
                         try:
                             for subresult in result:
-                                self.store_result(backend, subresult)
-                        except Exception as error:
-                            self.errors.append((backend, error, get_backtrace(error)))
+                                store(subresult)
+                                if cancelled.is_set():
+                                    self.logger.debug('%s: Call of function %s is cancelled', backend, function)
+                                    if hasattr(result, 'close'):
+                                        result.close()
+                                    break
+                        except CallCancelled:
+                            self.logger.debug('%s: Call of function %s is cancelled', backend, function)
+                        except Exception as e:
+                            # errors raised in a worker process come with their backtrace
+                            error(e, getattr(e, 'remote_backtrace', None) or get_backtrace(e))
                     else:
-                        self.store_result(backend, result)
+                        store(result)
+
+                if self.metrics is not None:
+                    self.metrics.record(backend.name, self.method, time.time() - start, **stats)
             finally:
-                self.tasks.task_done()
+                # the caller may start a new call as soon as it is notified
+                self.pool.release()
+                with self.mutex:
+                    if backend not in self.late:
+                        self.running.remove(backend)
+                        if not self.running:
+                            self.finished.set()
+                self.responses.put(self.FINISHED)
 
-    def _callback_thread_run(self, callback, errback, finishback):
-        while self.tasks.unfinished_tasks or not self.responses.empty():
+    def _remaining_time(self):
+        if self.deadline is None:
+            return None
+        return max(0, self.deadline - time.time())
+
+    def _expire(self):
+        with self.mutex:
+            for backend in self.running:
+                self.logger.debug('%s: Did not finish before the deadline', backend)
+                self.late.add(backend)
+                # ask it to stop, as it may hold the backend and a worker
+                self.backend_cancelled[backend].set()
+                self.errors.append((backend, CallTimeout('Did not answer within %s seconds' % self.timeout), ''))
+            self._release_slots(len(self.running))
+            self.running = []
+            self.finished.set()
+
+    def _get_response(self):
+        main = isinstance(current_thread(), _MainThread)
+        while True:
+            timeout = self._remaining_time()
+            if main and (timeout is None or timeout > self.MAIN_THREAD_TIMEOUT):
+                try:
+                    return self.responses.get(timeout=self.MAIN_THREAD_TIMEOUT)
+                except Queue.Empty:
+                    continue
+
+            # Raise Queue.Empty if the deadline is reached.
+            return self.responses.get(timeout=timeout)
+
+    def _iter_responses(self):
+        while self.pending:
             try:
-                response = self.responses.get(timeout=0.1)
-                if callback:
-                    callback(response)
+                response = self._get_response()
             except Queue.Empty:
+                # Deadline is reached: yield what has been received so far,
+                # and stop waiting for late backends.
+                self._expire()
+                self.pending = 0
+                for response in self._flush_responses():
+                    yield response
+                return
+
+            if response is self.FINISHED:
+                self.pending -= 1
                 continue
 
+            if self.slots is not None:
+                self.slots.release()
+            yield response
+
+    def _flush_responses(self):
+        while True:
+            try:
+                response = self.responses.get_nowait()
+            except Queue.Empty:
+                return
+
+            if response is not self.FINISHED:
+                yield response
+
+    def _callback_thread_run(self, callback, errback, finishback):
+        for response in self._iter_responses():
+            if callback:
+                callback(response)
+
         # Raise errors
         while errback and self.errors:
             errback(*self.errors.pop(0))
@@ -135,18 +329,221 @@ class BackendsCall(object):
         thread.start()
         return thread
 
+    def cancel(self):
+        """
+        Ask backends to stop as soon as possible.
+
+        Backends which are not started yet are not called, generators are
+        not consumed anymore, and browsers of running backends raise
+        :class:`weboob.exceptions.CallCancelled` on their next request.
+        Results received after this call are dropped.
+
+        It is automatically called when an iterator on this object is closed
+        before its end.
+        """
+        self.cancelled.set()
+        for event in self.backend_cancelled.itervalues():
+            event.set()
+        with self.mutex:
+            self._release_slots(len(self.running))
+
     def wait(self):
-        self.tasks.join()
+        """
+        Wait for all backends to finish, and raise :class:`CallErrors` if
+        any error occurred.
+
+        Do not use it with a *queue_size*, as nobody would consume results.
+        """
+        if not self.finished.wait(self._remaining_time()):
+            self._expire()
 
         if self.errors:
             raise CallErrors(self.errors)
 
     def __iter__(self):
-        while self.tasks.unfinished_tasks or not self.responses.empty():
-            try:
-                yield self.responses.get(timeout=0.1)
-            except Queue.Empty:
-                continue
+        try:
+            for response in self._iter_responses():
+                yield response
+        except GeneratorExit:
+            self.cancel()
+            raise
 
         if self.errors:
             raise CallErrors(self.errors)
+
+
+class SharedCall(object):
+    """
+    A :class:`BackendsCall` whose results are shared between several
+    consumers, each one using a :class:`CoalescedCall`.
+
+    Results are kept until the end of the call, so every consumer gets all
+    of them, even if it started to iterate late. Note that consumers get the
+    same objects.
+
+    :param call: call to share
+    :type call: :class:`BackendsCall`
+    :param forget: if specified, called without arguments when the call is
+                   over or cancelled, and so can't take new consumers
+    :type forget: callable
+    """
+
+    def __init__(self, call, forget=None):
+        self.call = call
+        self.forget = forget
+        self.condition = Condition()
+        self.results = []
+        self.errors = []
+        self.done = False
+        self.consumers = 0
+
+        call.callback_thread(self._on_result, self._on_error, self._on_finish)
+
+    def _on_result(self, result):
+        with self.condition:
+            self.results.append(result)
+            self.condition.notify_all()
+
+    def _on_error(self, backend, error, backtrace):
+        with self.condition:
+            self.errors.append((backend, error, backtrace))
+
+    def _on_finish(self):
+        with self.condition:
+            self.done = True
+            self.condition.notify_all()
+        if self.forget:
+            self.forget()
+
+    def consume(self, timeout=None):
+        """
+        Get a new consumer of this call.
+
+        :param timeout: see :class:`BackendsCall`
+        :rtype: :class:`CoalescedCall`
+        """
+        with self.condition:
+            self.consumers += 1
+        return CoalescedCall(self, timeout)
+
+    def release(self):
+        """
+        Called by a consumer which does not want results anymore. When there
+        is no more consumer, the call is cancelled.
+        """
+        with self.condition:
+            self.consumers -= 1
+            if self.consumers > 0 or self.done:
+                return
+        if self.forget:
+            self.forget()
+        self.call.cancel()
+
+
+class CoalescedCall(object):
+    """
+    Consumer of a :class:`SharedCall`.
+
+    It has the same interface than :class:`BackendsCall`.
+    """
+
+    def __init__(self, shared, timeout=None):
+        self.shared = shared
+        self.timeout = timeout
+        self.deadline = None if timeout is None else time.time() + timeout
+        self.released = False
+
+    def _wait(self, count):
+        # Wait for more than *count* results, or for the end of the call.
+        # Return False if the deadline is reached.
+        main = isinstance(current_thread(), _MainThread)
+        condition = self.shared.condition
+        with condition:
+            while len(self.shared.results) <= count and not self.shared.done:
+                timeout = None
+                if self.deadline is not None:
+                    timeout = self.deadline - time.time()
+                    if timeout <= 0:
+                        return False
+                if main:
+                    timeout = min(timeout or BackendsCall.MAIN_THREAD_TIMEOUT, BackendsCall.MAIN_THREAD_TIMEOUT)
+                condition.wait(timeout)
+        return True
+
+    def _get_errors(self):
+        with self.shared.condition:
+            errors = list(self.shared.errors)
+            if not self.shared.done:
+                for backend in list(self.shared.call.running):
+                    errors.append((backend, CallTimeout('Did not answer within %s seconds' % self.timeout), ''))
+        return errors
+
+    def _release(self):
+        if not self.released:
+            self.released = True
+            self.shared.release()
+
+    def __iter__(self):
+        count = 0
+        try:
+            while self._wait(count):
+                with self.shared.condition:
+                    results = self.shared.results[count:]
+                    done = self.shared.done
+                for result in results:
+                    yield result
+                count += len(results)
+
+                if done and count == len(self.shared.results):
+                    break
+        except GeneratorExit:
+            self.cancel()
+            raise
+
+        errors = self._get_errors()
+        if errors:
+            raise CallErrors(errors)
+
+    def _callback_thread_run(self, callback, errback, finishback):
+        try:
+            for result in self:
+                if callback:
+                    callback(result)
+        except CallErrors as errors:
+            while errback and errors.errors:
+                errback(*errors.errors.pop(0))
+
+        if finishback:
+            finishback()
+
+    def callback_thread(self, callback, errback=None, finishback=None):
+        """
+        See :func:`BackendsCall.callback_thread`.
+        """
+        thread = Thread(target=self._callback_thread_run, args=(callback, errback, finishback))
+        thread.start()
+        return thread
+
+    def cancel(self):
+        """
+        Stop consuming this call. The shared call is cancelled if nobody else
+        consumes it.
+        """
+        self._release()
+
+    def wait(self):
+        """
+        See :func:`BackendsCall.wait`.
+        """
+        with self.shared.condition:
+            count = len(self.shared.results)
+        while self._wait(count):
+            with self.shared.condition:
+                if self.shared.done:
+                    break
+                count = len(self.shared.results)
+
+        errors = self._get_errors()
+        if errors:
+            raise CallErrors(errors)
+
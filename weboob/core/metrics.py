@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2010-2016 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+
+from threading import Lock
+
+from weboob.tools.json import json
+
+
+__all__ = ['Histogram', 'CallMetrics', 'MetricsRegistry']
+
+
+class Histogram(object):
+    """
+    Running histogram of durations, with cumulative buckets like Prometheus
+    ones.
+
+    :param buckets: upper bounds of buckets, in seconds
+    :type buckets: tuple[:class:`float`]
+    """
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+    def __init__(self, buckets=None):
+        self.buckets = tuple(buckets or self.BUCKETS)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+    def to_dict(self):
+        return {'count': self.count,
+                'sum': self.sum,
+                'buckets': [[bound, count] for bound, count in zip(self.buckets, self.counts)],
+               }
+
+
+class CallMetrics(object):
+    """
+    Metrics of calls of a method on a backend.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.results = 0
+        self.errors = {}
+        self.wall_time = Histogram()
+        self.first_result_time = Histogram()
+
+    def record(self, wall_time, first_result_time, results, error_class):
+        self.calls += 1
+        self.results += results
+        self.wall_time.observe(wall_time)
+        if first_result_time is not None:
+            self.first_result_time.observe(first_result_time)
+        if error_class is not None:
+            self.errors[error_class] = self.errors.get(error_class, 0) + 1
+
+    def to_dict(self):
+        return {'calls': self.calls,
+                'results': self.results,
+                'errors': dict(self.errors),
+                'wall_time': self.wall_time.to_dict(),
+                'first_result_time': self.first_result_time.to_dict(),
+               }
+
+
+class MetricsRegistry(object):
+    """
+    Registry of metrics of calls on backends, filled by
+    :class:`weboob.core.bcall.BackendsCall`.
+    """
+
+    def __init__(self):
+        self.mutex = Lock()
+        self.metrics = {}
+
+    def record(self, backend, method, wall_time, first_result_time=None, results=0, error_class=None):
+        """
+        Record a call.
+
+        :param backend: name of backend
+        :type backend: :class:`str`
+        :param method: name of the called method
+        :type method: :class:`str`
+        :param wall_time: duration of the call, in seconds
+        :type wall_time: :class:`float`
+        :param first_result_time: time before the first result, in seconds
+        :type first_result_time: :class:`float`
+        :param results: number of results
+        :type results: :class:`int`
+        :param error_class: name of the class of the raised error, if any
+        :type error_class: :class:`str`
+        """
+        with self.mutex:
+            try:
+                metrics = self.metrics[(backend, method)]
+            except KeyError:
+                metrics = self.metrics[(backend, method)] = CallMetrics()
+            metrics.record(wall_time, first_result_time, results, error_class)
+
+    def reset(self):
+        with self.mutex:
+            self.metrics = {}
+
+    def to_dict(self):
+        """
+        Get metrics, by backend and method.
+
+        :rtype: :class:`dict`
+        """
+        result = {}
+        with self.mutex:
+            for (backend, method), metrics in self.metrics.iteritems():
+                result.setdefault(backend, {})[method] = metrics.to_dict()
+        return result
+
+    def dump_json(self):
+        """
+        Dump metrics in JSON.
+
+        :rtype: :class:`str`
+        """
+        return json.dumps(self.to_dict(), sort_keys=True, indent=2)
+
+    def dump_prometheus(self):
+        """
+        Dump metrics in the Prometheus text format.
+
+        :rtype: :class:`str`
+        """
+        lines = []
+
+        def labels(backend, method, **kwargs):
+            items = [('backend', backend), ('method', method)] + sorted(kwargs.items())
+            return '{%s}' % ','.join('%s="%s"' % (key, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                                     for key, value in items)
+
+        def histogram(name, description, attr):
+            lines.append('# HELP %s %s' % (name, description))
+            lines.append('# TYPE %s histogram' % name)
+            for (backend, method), metrics in items:
+                histo = getattr(metrics, attr)
+                for bound, count in zip(histo.buckets, histo.counts):
+                    lines.append('%s_bucket%s %d' % (name, labels(backend, method, le=repr(float(bound))), count))
+                lines.append('%s_bucket%s %d' % (name, labels(backend, method, le='+Inf'), histo.count))
+                lines.append('%s_sum%s %r' % (name, labels(backend, method), histo.sum))
+                lines.append('%s_count%s %d' % (name, labels(backend, method), histo.count))
+
+        def counter(name, description, getter):
+            lines.append('# HELP %s %s' % (name, description))
+            lines.append('# TYPE %s counter' % name)
+            for (backend, method), metrics in items:
+                for extra, value in getter(metrics):
+                    lines.append('%s%s %d' % (name, labels(backend, method, **extra), value))
+
+        with self.mutex:
+            items = sorted(self.metrics.iteritems())
+            counter('weboob_backend_calls_total', 'Number of calls on backends.',
+                    lambda m: [({}, m.calls)])
+            counter('weboob_backend_results_total', 'Number of results returned by backends.',
+                    lambda m: [({}, m.results)])
+            counter('weboob_backend_errors_total', 'Number of errors raised by backends, by class.',
+                    lambda m: [({'error': error}, count) for error, count in sorted(m.errors.iteritems())])
+            histogram('weboob_backend_call_duration_seconds', 'Wall time of calls on backends.', 'wall_time')
+            histogram('weboob_backend_first_result_seconds', 'Time before the first result of calls on backends.',
+                      'first_result_time')
+
+        return '\n'.join(lines) + '\n'
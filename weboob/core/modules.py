@@ -18,14 +18,21 @@
 # along with weboob. If not, see <http://www.gnu.org/licenses/>.
 
 import os
+import ast
 import imp
 import logging
+import tempfile
+from threading import RLock
+from importlib import import_module
 
+from weboob.capabilities.base import Capability
 from weboob.tools.backend import Module
+from weboob.tools.json import json
 from weboob.tools.log import getLogger
+from weboob.tools.misc import get_backtrace
 
 
-__all__ = ['LoadedModule', 'ModulesLoader', 'RepositoryModulesLoader', 'ModuleLoadError']
+__all__ = ['LoadedModule', 'ModuleMetadata', 'ModulesLoader', 'RepositoryModulesLoader', 'ModuleLoadError']
 
 
 class ModuleLoadError(Exception):
@@ -99,24 +106,233 @@ class LoadedModule(object):
         return backend_instance
 
 
+class ModuleMetadata(object):
+    """
+    Metadata of a module, read from its sources without importing it.
+
+    The *config* attribute is an ordered list of ``(key, field)`` tuples,
+    where *field* is a dict with the ``type``, ``label``, ``description``,
+    ``default``, ``regexp``, ``choices``, ``masked`` and ``required`` items
+    of the :class:`weboob.tools.value.Value`. Choices are a list of
+    ``(value, label)`` tuples.
+    """
+
+    FIELDS = ('path', 'mtime', 'name', 'version', 'description', 'maintainer',
+              'license', 'icon', 'capabilities', 'config')
+
+    # attributes of the Module class which are read
+    ATTRIBUTES = ('NAME', 'VERSION', 'DESCRIPTION', 'MAINTAINER', 'EMAIL', 'LICENSE', 'ICON')
+
+    def __init__(self, path, mtime=0, **kwargs):
+        self.path = path
+        self.mtime = mtime
+        self.name = kwargs.pop('name', None)
+        self.version = kwargs.pop('version', None)
+        self.description = kwargs.pop('description', u'')
+        self.maintainer = kwargs.pop('maintainer', u'')
+        self.license = kwargs.pop('license', u'')
+        self.icon = kwargs.pop('icon', None)
+        self.capabilities = kwargs.pop('capabilities', [])
+        self.config = []
+        for key, field in kwargs.pop('config', []):
+            if field['choices'] is not None:
+                field['choices'] = [tuple(choice) for choice in field['choices']]
+            self.config.append((key, field))
+
+    def iter_caps(self):
+        return iter(self.capabilities)
+
+    def has_caps(self, *caps):
+        for c in caps:
+            if isinstance(c, type):
+                c = c.__name__
+            if c in self.capabilities:
+                return True
+        return False
+
+    def to_dict(self):
+        return dict((field, getattr(self, field)) for field in self.FIELDS)
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(**d)
+
+    @classmethod
+    def from_loaded(cls, path, mtime, module):
+        """
+        Get metadata of an imported module.
+
+        :type module: :class:`LoadedModule`
+        """
+        config = []
+        for key, value in module.config.iteritems():
+            choices = value.choices
+            if choices is not None:
+                choices = list(choices.items())
+            config.append((key, {'type': type(value).__name__,
+                                 'label': value.label,
+                                 'description': value.description,
+                                 'default': value.default,
+                                 'regexp': value.regexp,
+                                 'choices': choices,
+                                 'masked': value.masked,
+                                 'required': value.required,
+                                }))
+
+        return cls(path, mtime, name=module.name, version=module.version, description=module.description,
+                   maintainer=module.maintainer, license=module.license, icon=module.icon,
+                   capabilities=sorted(set(cap.__name__ for cap in module.iter_caps())), config=config)
+
+    @classmethod
+    def parse(cls, path, mtime, module_name):
+        """
+        Get metadata of a module by parsing its sources.
+
+        Only literal values of the Module subclass are understood: a
+        :class:`ValueError` is raised when something can't be known without
+        importing the module.
+        """
+        package_path = os.path.join(path, module_name)
+        for filename in sorted(os.listdir(package_path)):
+            if not filename.endswith('.py'):
+                continue
+
+            with open(os.path.join(package_path, filename), 'rb') as f:
+                tree = ast.parse(f.read(), filename)
+
+            # imported names, to resolve capabilities
+            imports = {}
+            for node in tree.body:
+                if isinstance(node, ast.ImportFrom) and node.level == 0:
+                    for alias in node.names:
+                        imports[alias.asname or alias.name] = (node.module, alias.name)
+
+            for node in tree.body:
+                if isinstance(node, ast.ClassDef) and cls._is_module_class(node):
+                    return cls._parse_class(path, mtime, node, imports)
+
+        raise ValueError('No Module class found')
+
+    @staticmethod
+    def _is_module_class(node):
+        attributes = [target.id for stmt in node.body if isinstance(stmt, ast.Assign)
+                      for target in stmt.targets if isinstance(target, ast.Name)]
+        bases = [base.id for base in node.bases if isinstance(base, ast.Name)]
+        return 'NAME' in attributes and any(base.endswith('Module') for base in bases)
+
+    @classmethod
+    def _parse_class(cls, path, mtime, node, imports):
+        values = {}
+        config = None
+        for stmt in node.body:
+            if not isinstance(stmt, ast.Assign) or len(stmt.targets) != 1 or not isinstance(stmt.targets[0], ast.Name):
+                continue
+            attrname = stmt.targets[0].id
+            if attrname in cls.ATTRIBUTES:
+                values[attrname] = ast.literal_eval(stmt.value)
+            elif attrname == 'CONFIG':
+                config = cls._parse_config(stmt.value)
+
+        capabilities = set()
+        inherits = False
+        for base in node.bases:
+            if not isinstance(base, ast.Name):
+                raise ValueError('Unable to resolve base class')
+            if base.id == 'Module':
+                continue
+            if base.id not in imports:
+                raise ValueError('Unable to resolve base class %s' % base.id)
+            klass = getattr(import_module(imports[base.id][0]), imports[base.id][1])
+            if issubclass(klass, Capability):
+                capabilities.update(cap.__name__ for cap in klass.mro()
+                                    if issubclass(cap, Capability) and cap != Capability and cap != object)
+            else:
+                inherits = True
+
+        if inherits and (config is None or set(values) != set(cls.ATTRIBUTES)):
+            raise ValueError('Attributes are inherited from another module')
+
+        for attrname in cls.ATTRIBUTES:
+            values.setdefault(attrname, getattr(Module, attrname))
+
+        return cls(path, mtime, name=values['NAME'], version=values['VERSION'],
+                   description=values['DESCRIPTION'], maintainer=u'%s <%s>' % (values['MAINTAINER'], values['EMAIL']),
+                   license=values['LICENSE'], icon=values['ICON'],
+                   capabilities=sorted(capabilities), config=config or [])
+
+    @staticmethod
+    def _has_star_args(node):
+        # Python 2 has starargs and kwargs attributes on calls, while
+        # Python 3 has Starred arguments and keywords without name.
+        return getattr(node, 'starargs', None) is not None or getattr(node, 'kwargs', None) is not None or \
+               any(isinstance(arg, getattr(ast, 'Starred', ())) for arg in node.args) or \
+               any(keyword.arg is None for keyword in node.keywords)
+
+    @classmethod
+    def _parse_config(cls, node):
+        if not isinstance(node, ast.Call) or not isinstance(node.func, ast.Name) or \
+           node.func.id != 'BackendConfig' or node.keywords or cls._has_star_args(node):
+            raise ValueError('Unable to parse CONFIG')
+
+        config = []
+        for value in node.args:
+            if not isinstance(value, ast.Call) or not isinstance(value.func, ast.Name) or \
+               not value.func.id.startswith('Value') or len(value.args) != 1 or cls._has_star_args(value):
+                raise ValueError('Unable to parse CONFIG')
+
+            kwargs = {}
+            for keyword in value.keywords:
+                if keyword.arg == 'choices' and isinstance(keyword.value, ast.Call) and \
+                   isinstance(keyword.value.func, ast.Name) and keyword.value.func.id == 'OrderedDict' and \
+                   len(keyword.value.args) == 1 and not keyword.value.keywords:
+                    kwargs['choices'] = list(ast.literal_eval(keyword.value.args[0]))
+                else:
+                    kwargs[keyword.arg] = ast.literal_eval(keyword.value)
+
+            default = kwargs.get('default')
+            choices = kwargs.get('choices')
+            if isinstance(choices, dict):
+                choices = list(choices.items())
+            elif choices is not None:
+                choices = [choice if isinstance(choice, tuple) else (choice, choice) for choice in choices]
+            config.append((ast.literal_eval(value.args[0]),
+                           {'type': value.func.id,
+                            'label': kwargs.get('label', kwargs.get('description')),
+                            'description': kwargs.get('description', kwargs.get('label')),
+                            'default': default,
+                            'regexp': kwargs.get('regexp'),
+                            'choices': choices,
+                            'masked': kwargs.get('masked', value.func.id == 'ValueBackendPassword'),
+                            'required': kwargs.get('required', default is None),
+                           }))
+        return config
+
+
 class ModulesLoader(object):
     """
     Load modules.
     """
 
-    def __init__(self, path, version=None):
+    def __init__(self, path, version=None, index_path=None):
         self.version = version
         self.path = path
         self.loaded = {}
         self.logger = getLogger('modules')
+        # modules may be loaded by several threads at once
+        self.mutex = RLock()
+
+        # metadata of modules, by name, saved in index_path if set
+        self.index_path = index_path
+        self.index = None
 
     def get_or_load_module(self, module_name):
         """
         Can raise a ModuleLoadError exception.
         """
-        if module_name not in self.loaded:
-            self.load_module(module_name)
-        return self.loaded[module_name]
+        with self.mutex:
+            if module_name not in self.loaded:
+                self.load_module(module_name)
+            return self.loaded[module_name]
 
     def iter_existing_module_names(self):
         for name in os.listdir(self.path):
@@ -127,14 +343,116 @@ class ModulesLoader(object):
                 # if path/name is not a directory
                 continue
 
-    def load_all(self):
-        for existing_module_name in self.iter_existing_module_names():
+    def load_all(self, caps=None):
+        """
+        Load existing modules.
+
+        Modules are selected with their metadata, so the ones which do not
+        implement the capabilities are not imported.
+
+        :param caps: only modules which implement at least one of these capabilities
+        :type caps: list
+        """
+        for info in self.iter_modules_info(caps):
             try:
-                self.load_module(existing_module_name)
+                self.load_module(info.name)
             except ModuleLoadError as e:
                 self.logger.warning(e)
 
+    def get_module_info(self, module_name):
+        """
+        Get metadata of a module, without importing it if possible.
+
+        Metadata are cached, and are read again only when a file of the
+        module has changed. Can raise a ModuleLoadError exception.
+
+        :rtype: :class:`ModuleMetadata`
+        """
+        with self.mutex:
+            info, changed = self._get_module_info(module_name)
+            if changed:
+                self._save_index()
+            return info
+
+    def _get_module_info(self, module_name):
+        path = self.get_module_path(module_name)
+        try:
+            mtime = get_tree_mtime(os.path.join(path, module_name))
+        except OSError as e:
+            raise ModuleLoadError(module_name, e)
+
+        if self.index is None:
+            self.index = self._load_index()
+
+        info = self.index.get(module_name)
+        if info is not None and info.path == path and info.mtime == mtime:
+            return info, False
+
+        try:
+            info = ModuleMetadata.parse(path, mtime, module_name)
+        except Exception as e:
+            self.logger.debug('Unable to parse module "%s", importing it: %s' % (module_name, e))
+            self.load_module(module_name)
+            info = ModuleMetadata.from_loaded(path, mtime, self.loaded[module_name])
+
+        self.index[module_name] = info
+        return info, True
+
+    def iter_modules_info(self, caps=None):
+        """
+        Iter on metadata of existing modules.
+
+        :param caps: only modules which implement at least one of these capabilities
+        :type caps: list
+        :rtype: iter[:class:`ModuleMetadata`]
+        """
+        modules = []
+        changed = False
+        with self.mutex:
+            for module_name in self.iter_existing_module_names():
+                try:
+                    info, info_changed = self._get_module_info(module_name)
+                except ModuleLoadError as e:
+                    self.logger.warning(e)
+                    continue
+
+                changed = changed or info_changed
+                if not caps or info.has_caps(*caps):
+                    modules.append(info)
+
+            if changed:
+                self._save_index()
+        return iter(modules)
+
+    def _load_index(self):
+        if self.index_path is None or not os.path.exists(self.index_path):
+            return {}
+
+        try:
+            with open(self.index_path, 'r') as f:
+                return dict((name, ModuleMetadata.from_dict(d)) for name, d in json.load(f).iteritems())
+        except (IOError, ValueError, TypeError) as e:
+            self.logger.warning('Unable to read the modules index %s: %s' % (self.index_path, e))
+            return {}
+
+    def _save_index(self):
+        if self.index_path is None:
+            return
+
+        try:
+            data = json.dumps(dict((name, info.to_dict()) for name, info in self.index.iteritems()))
+            # write in a temporary file to avoid corruption problems
+            with tempfile.NamedTemporaryFile(dir=os.path.dirname(self.index_path), delete=False) as f:
+                f.write(data)
+            os.rename(f.name, self.index_path)
+        except (IOError, OSError, TypeError, ValueError):
+            self.logger.warning('Unable to save the modules index %s: %s' % (self.index_path, get_backtrace()))
+
     def load_module(self, module_name):
+        with self.mutex:
+            self._load_module(module_name)
+
+    def _load_module(self, module_name):
         if module_name in self.loaded:
             self.logger.debug('Module "%s" is already loaded from %s' % (module_name, self.loaded[module_name].package.__path__[0]))
             return
@@ -169,8 +487,11 @@ class RepositoryModulesLoader(ModulesLoader):
     Load modules from repositories.
     """
 
+    INDEX = 'modules.index'
+
     def __init__(self, repositories):
-        super(RepositoryModulesLoader, self).__init__(repositories.modules_dir, repositories.version)
+        super(RepositoryModulesLoader, self).__init__(repositories.modules_dir, repositories.version,
+                                                      os.path.join(repositories.modules_dir, self.INDEX))
         self.repositories = repositories
 
     def iter_existing_module_names(self):
@@ -185,3 +506,15 @@ class RepositoryModulesLoader(ModulesLoader):
             raise ModuleLoadError(module_name, 'Module %s is not installed' % module_name)
 
         return minfo.path
+
+
+def get_tree_mtime(path):
+    """
+    Get the last modification time of a directory tree.
+    """
+    mtime = os.path.getmtime(path)
+    for root, dirs, files in os.walk(path):
+        for name in files:
+            if not name.endswith(('.pyc', '.pyo')):
+                mtime = max(mtime, os.path.getmtime(os.path.join(root, name)))
+    return mtime
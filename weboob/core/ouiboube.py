@@ -19,15 +19,20 @@
 
 
 import os
+from threading import Lock
 
-from weboob.core.bcall import BackendsCall
+from weboob.core.bcall import BackendsCall, SharedCall
 from weboob.core.modules import ModulesLoader, RepositoryModulesLoader, ModuleLoadError
 from weboob.core.backendscfg import BackendsConfig
+from weboob.core.metrics import MetricsRegistry
+from weboob.core.processes import ProcessPool
 from weboob.core.repositories import Repositories, PrintProgress
-from weboob.core.scheduler import Scheduler
+from weboob.core.scheduler import HeapScheduler
+from weboob.core.workers import WorkerPool
 from weboob.tools.backend import Module
 from weboob.tools.config.iconfig import ConfigError
 from weboob.tools.log import getLogger
+from weboob.tools.startup import startup_step
 
 
 __all__ = ['WebNip', 'Weboob']
@@ -48,14 +53,23 @@ class WebNip(object):
     :type modules_path: :class:`basestring`
     :param storage: provide a storage where backends can save data
     :type storage: :class:`weboob.tools.storage.IStorage`
-    :param scheduler: what scheduler to use; default is :class:`weboob.core.scheduler.Scheduler`
+    :param scheduler: what scheduler to use; default is :class:`weboob.core.scheduler.HeapScheduler`
     :type scheduler: :class:`weboob.core.scheduler.IScheduler`
+    :param max_workers: maximum number of threads used to call backends;
+                        default is :attr:`MAX_WORKERS`
+    :type max_workers: :class:`int`
     """
     VERSION = '1.1'
+    MAX_WORKERS = 100
 
-    def __init__(self, modules_path=None, storage=None, scheduler=None):
+    def __init__(self, modules_path=None, storage=None, scheduler=None, max_workers=None):
         self.logger = getLogger('weboob')
         self.backend_instances = {}
+        self.workers = WorkerPool(max_workers or self.MAX_WORKERS, name='backend')
+        self.processes = ProcessPool()
+        self.metrics = MetricsRegistry()
+        self.flights = {}
+        self.flights_mutex = Lock()
         self.callbacks = {'login':   lambda backend_name, value: None,
                           'captcha': lambda backend_name, image: None,
                          }
@@ -68,7 +82,7 @@ class WebNip(object):
             self.modules_loader = ModulesLoader(modules_path, self.VERSION)
 
         if scheduler is None:
-            scheduler = Scheduler()
+            scheduler = HeapScheduler()
         self.scheduler = scheduler
 
         self.storage = storage
@@ -82,6 +96,8 @@ class WebNip(object):
         properly unload all correctly.
         """
         self.unload_backends()
+        self.processes.stop()
+        self.workers.shutdown(wait=False)
 
     def build_backend(self, module_name, params=None, storage=None, name=None):
         """
@@ -155,7 +171,8 @@ class WebNip(object):
 
         for name in names:
             backend = self.backend_instances.pop(name)
-            with backend:
+            with backend.exclusive():
+                self.processes.stop([name])
                 backend.deinit()
             unloaded[backend.name] = backend
 
@@ -216,8 +233,8 @@ class WebNip(object):
 
     def do(self, function, *args, **kwargs):
         r"""
-        Do calls on loaded backends with specified arguments, in separated
-        threads.
+        Do calls on loaded backends with specified arguments, in threads of
+        the workers pool.
 
         This function has two modes:
 
@@ -227,12 +244,33 @@ class WebNip(object):
           the locked backend instance at first arguments, and \*args and
           \*\*kwargs.
 
+        Backends configured with the ``_process`` private option are called
+        in their own worker process (see :mod:`weboob.core.processes`), as
+        long as the function and arguments can be pickled; results are sent
+        back as serialized objects.
+
         :param function: backend's method name, or a callable object
         :type function: :class:`str`
         :param backends: list of backends to iterate on
         :type backends: list[:class:`str`]
         :param caps: iterate on backends which implement this caps
         :type caps: list[:class:`weboob.capabilities.base.Capability`]
+        :param timeout: if specified, maximum number of seconds to wait for
+                        results; backends which are still running after this
+                        delay are reported with a :class:`weboob.core.bcall.CallTimeout`
+                        error, and results received so far are kept
+        :type timeout: :class:`float`
+        :param queue_size: if specified, maximum number of results waiting to
+                           be consumed, to slow down backends when the caller
+                           is slower than them
+        :type queue_size: :class:`int`
+        :param coalesce: if true, share the call with the identical ones
+                         (same function, arguments and backends) which are
+                         still running, instead of calling backends again;
+                         the same result objects are given to every caller;
+                         *queue_size* is then ignored, as results are kept
+                         for every caller until the end of the call
+        :type coalesce: :class:`bool`
         :rtype: A :class:`weboob.core.bcall.BackendsCall` object (iterable)
         """
         backends = self.backend_instances.values()
@@ -263,11 +301,45 @@ class WebNip(object):
             caps = kwargs.pop('caps')
             backends = [backend for backend in backends if backend.has_caps(caps)]
 
+        timeout = kwargs.pop('timeout', None)
+        queue_size = kwargs.pop('queue_size', 0)
+        coalesce = kwargs.pop('coalesce', False)
+
+        if coalesce:
+            key = (function, args, tuple(sorted(kwargs.iteritems())),
+                   tuple(sorted(backend.name for backend in backends)))
+            try:
+                hash(key)
+            except TypeError:
+                self.logger.debug(u'Unable to coalesce call of %r with unhashable arguments', function)
+            else:
+                if queue_size:
+                    self.logger.debug(u'Ignoring queue_size of coalesced call of %r', function)
+                return self._coalesced_call(key, backends, function, args, kwargs, timeout)
+
         # The return value MUST BE the BackendsCall instance. Please never iterate
         # here on this object, because caller might want to use other methods, like
         # wait() on callback_thread().
         # Thanks a lot.
-        return BackendsCall(backends, function, *args, **kwargs)
+        return BackendsCall(backends, function, *args, pool=self.workers,
+                            timeout=timeout, queue_size=queue_size,
+                            processes=self.processes, metrics=self.metrics, **kwargs)
+
+    def _coalesced_call(self, key, backends, function, args, kwargs, timeout):
+        with self.flights_mutex:
+            shared = self.flights.get(key)
+            if shared is None:
+                def forget():
+                    with self.flights_mutex:
+                        if self.flights.get(key) is shared:
+                            del self.flights[key]
+
+                call = BackendsCall(backends, function, *args, pool=self.workers,
+                                    processes=self.processes, metrics=self.metrics, **kwargs)
+                shared = self.flights[key] = SharedCall(call, forget)
+            else:
+                self.logger.debug(u'Coalescing call of %r with a running one', function)
+            return shared.consume(timeout)
 
     def schedule(self, interval, function, *args):
         """
@@ -282,10 +354,14 @@ class WebNip(object):
         """
         return self.scheduler.schedule(interval, function, *args)
 
-    def repeat(self, interval, function, *args):
+    def repeat(self, interval, function, *args, **kwargs):
         """
         Repeat a call to a function
 
+        Keyword arguments are given to the scheduler, see
+        :func:`weboob.core.scheduler.HeapScheduler.repeat`. Named jobs are
+        saved in the storage, unless the scheduler has its own.
+
         :param interval: interval between two calls
         :type interval: int
         :param function: function to call
@@ -293,7 +369,10 @@ class WebNip(object):
         :param args: arguments to give to function
         :returns: an event identificator
         """
-        return self.scheduler.repeat(interval, function, *args)
+        if self.storage is not None and getattr(self.scheduler, 'storage', False) is None:
+            # the storage is usually set after the creation of the scheduler
+            self.scheduler.storage = self.storage
+        return self.scheduler.repeat(interval, function, *args, **kwargs)
 
     def cancel(self, ev):
         """
@@ -328,11 +407,14 @@ class Weboob(WebNip):
     :type backends_filename: str
     :param storage: provide a storage where backends can save data
     :type storage: :class:`weboob.tools.storage.IStorage`
+    :param max_workers: maximum number of threads used to call backends
+    :type max_workers: :class:`int`
     """
     BACKENDS_FILENAME = 'backends'
 
-    def __init__(self, workdir=None, backends_filename=None, scheduler=None, storage=None):
-        super(Weboob, self).__init__(modules_path=False, scheduler=scheduler, storage=storage)
+    def __init__(self, workdir=None, backends_filename=None, scheduler=None, storage=None, max_workers=None):
+        super(Weboob, self).__init__(modules_path=False, scheduler=scheduler, storage=storage,
+                                     max_workers=max_workers)
 
         # Create WORKDIR
         if workdir is not None:
@@ -347,7 +429,8 @@ class Weboob(WebNip):
         self._create_dir(workdir)
 
         # Modules management
-        self.repositories = Repositories(workdir, datadir, self.VERSION)
+        with startup_step('repositories'):
+            self.repositories = Repositories(workdir, datadir, self.VERSION)
         self.modules_loader = RepositoryModulesLoader(self.repositories)
 
         # Backend instances config
@@ -417,6 +500,7 @@ class Weboob(WebNip):
         :rtype: dict[:class:`str`, :class:`weboob.tools.backend.Module`]
         """
         loaded = {}
+        to_create = []
         if storage is None:
             storage = self.storage
 
@@ -443,7 +527,8 @@ class Weboob(WebNip):
             if not minfo.is_installed():
                 self.repositories.install(minfo)
 
-            module = None
+            # Imports are serialized by the modules loader and the import
+            # lock, so modules are loaded here rather than in workers.
             try:
                 module = self.modules_loader.get_or_load_module(module_name)
             except ModuleLoadError as e:
@@ -454,11 +539,22 @@ class Weboob(WebNip):
                 self.logger.warning(u'Oops, the backend "%s" is already loaded. Unload it before reloading...', instance_name)
                 self.unload_backends(instance_name)
 
-            try:
-                backend_instance = module.create_instance(self, instance_name, params, storage)
-            except Module.ConfigError as e:
+            to_create.append((module, instance_name, params))
+
+        # Instances are created in parallel, as it may involve commands to
+        # get passwords, but errors are processed in the order of the
+        # configuration.
+        results = self.workers.map(lambda args: self._create_instance(storage, *args), to_create)
+        for (module, instance_name, params), (backend_instance, error) in zip(to_create, results):
+            if error is not None:
                 if errors is not None:
-                    errors.append(self.LoadError(instance_name, e))
+                    errors.append(self.LoadError(instance_name, error))
             else:
                 self.backend_instances[instance_name] = loaded[instance_name] = backend_instance
         return loaded
+
+    def _create_instance(self, storage, module, instance_name, params):
+        try:
+            return module.create_instance(self, instance_name, params, storage), None
+        except Module.ConfigError as e:
+            return None, e
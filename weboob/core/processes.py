@@ -0,0 +1,325 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2010-2016 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+
+import logging
+import os
+import select
+import struct
+import subprocess
+import sys
+import time
+from threading import Lock
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+from weboob.tools.log import getLogger
+from weboob.tools.misc import get_backtrace, to_unicode
+from weboob.tools.value import ValueBackendPassword
+
+
+__all__ = ['BackendProcess', 'BackendProcessError', 'ProcessPool']
+
+
+class BackendProcessError(Exception):
+    """
+    Error raised in a worker process, which can't be sent back as is.
+
+    :param name: name of the class of the original exception
+    :type name: :class:`str`
+    :param message: message of the original exception
+    :type message: :class:`unicode`
+    """
+
+    def __init__(self, name, message):
+        Exception.__init__(self, u'%s: %s' % (name, message))
+        self.name = name
+
+
+class Connection(object):
+    """
+    Messages of bytes sent through a socket.
+    """
+
+    HEADER = struct.Struct('!I')
+
+    def __init__(self, sock):
+        self.sock = sock
+
+    def send_bytes(self, data):
+        self.sock.sendall(self.HEADER.pack(len(data)) + data)
+
+    def recv_bytes(self):
+        size, = self.HEADER.unpack(self._recv_exactly(self.HEADER.size))
+        return self._recv_exactly(size)
+
+    def _recv_exactly(self, size):
+        chunks = []
+        while size > 0:
+            chunk = self.sock.recv(min(size, 1024 * 1024))
+            if not chunk:
+                raise EOFError()
+            chunks.append(chunk)
+            size -= len(chunk)
+        return b''.join(chunks)
+
+    def poll(self):
+        return bool(select.select([self.sock], [], [], 0)[0])
+
+    def close(self):
+        self.sock.close()
+
+
+# Messages are a kind and a pickled payload, so the kind of a message can
+# always be read, even if its payload can't be unpickled.
+
+def dump_message(kind, *payload):
+    return pickle.dumps((kind, pickle.dumps(payload, pickle.HIGHEST_PROTOCOL)), pickle.HIGHEST_PROTOCOL)
+
+
+def send_message(conn, kind, *payload):
+    conn.send_bytes(dump_message(kind, *payload))
+
+
+def recv_message(conn):
+    """
+    Receive a message.
+
+    :returns: kind and pickled payload of the message
+    """
+    return pickle.loads(conn.recv_bytes())
+
+
+def send_error(conn, error):
+    backtrace = get_backtrace(error)
+    try:
+        data = pickle.dumps(error, pickle.HIGHEST_PROTOCOL)
+        # some exceptions can be pickled but not unpickled, for example
+        # when their constructor has other arguments than the message
+        pickle.loads(data)
+    except Exception:
+        data = None
+    send_message(conn, 'error', error.__class__.__name__, to_unicode(error), backtrace, data)
+
+
+def _load_error(payload):
+    name, message, backtrace, data = pickle.loads(payload)
+    error = None
+    if data is not None:
+        try:
+            error = pickle.loads(data)
+        except Exception:
+            pass
+    if error is None:
+        error = BackendProcessError(name, message)
+    error.remote_backtrace = backtrace
+    return error
+
+
+class BackendProcess(object):
+    """
+    Worker process in which calls on a backend are run.
+
+    The process is a new Python interpreter, and not a fork of the current
+    process, which can run threads holding locks. A copy of the backend is
+    created there from its module, configuration and storage, and keeps its
+    state (for example the browser session) between calls. Changes of its
+    storage are sent back to the backend of the current process.
+
+    Calls are serialized: the caller has to hold the lock of the backend.
+
+    :param backend: backend to run
+    :type backend: :class:`weboob.tools.backend.Module`
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.logger = getLogger('processes')
+
+        klass = backend.__class__
+        package = sys.modules[klass.__module__.split('.')[0]]
+        path = os.path.dirname(package.__path__[0] if hasattr(package, '__path__') else package.__file__)
+        init = (package.__name__, path, klass.__module__, klass.__name__, backend.name,
+                self._dump_config(backend), backend.storage.get(default={}) if backend.storage.storage else None,
+                logging.root.level)
+
+        # not imported with this module, as most applications never start a
+        # worker process
+        import socket
+        sock, child_sock = socket.socketpair()
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(p or os.getcwd() for p in sys.path)
+        try:
+            self.process = subprocess.Popen([sys.executable, '-c', 'from weboob.core.processworker import main; main()'],
+                                            stdin=child_sock.fileno(), env=env)
+        finally:
+            child_sock.close()
+        self.conn = Connection(sock)
+
+        send_message(self.conn, 'init', *init)
+        kind, payload = recv_message(self.conn)
+        if kind == 'error':
+            self.stop()
+            raise _load_error(payload)
+
+    @staticmethod
+    def _dump_config(backend):
+        config = dict(backend._private_config)
+        for name, value in backend.config.iteritems():
+            # passwords asked to the user are not dumped, and the worker
+            # process can't ask them
+            config[name] = value.get() if isinstance(value, ValueBackendPassword) else value.dump()
+        return config
+
+    def is_alive(self):
+        return self.process.poll() is None
+
+    def call(self, function, args, kwargs):
+        """
+        Call a function on the backend in the worker process.
+
+        Results and errors of the call are sent back as they come, through
+        an iterator. Closing this iterator cancels the call.
+
+        :param function: backend's method name, or callable object
+        :type function: :class:`str` or :class:`callable`
+        :returns: an iterator on results
+        :raises: :class:`BackendProcessError` if the function or the
+                 arguments can't be sent to the worker process
+        """
+        try:
+            data = dump_message('call', function, args, kwargs)
+        except Exception as e:
+            raise BackendProcessError(e.__class__.__name__, u'Unable to send the call of %r to the worker process: %s'
+                                                            % (function, to_unicode(e)))
+
+        return self._iter_results(data)
+
+    def _iter_results(self, data):
+        self.conn.send_bytes(data)
+        finished = False
+        try:
+            while True:
+                kind, payload = recv_message(self.conn)
+                if kind == 'result':
+                    # if it can't be unpickled, the call is cancelled
+                    yield pickle.loads(payload)[0]
+                    continue
+                if kind == 'storage':
+                    self._update_storage(payload)
+                    continue
+
+                finished = True
+                if kind == 'error':
+                    raise _load_error(payload)
+                return
+        finally:
+            if not finished:
+                self._cancel()
+
+    def _update_storage(self, payload):
+        values, saved = pickle.loads(payload)
+        self.backend.storage.storage.set('backends', self.backend.name, values)
+        if saved:
+            self.backend.storage.save()
+
+    def _cancel(self):
+        try:
+            send_message(self.conn, 'cancel')
+            while True:
+                kind, payload = recv_message(self.conn)
+                if kind == 'storage':
+                    self._update_storage(payload)
+                elif kind != 'result':
+                    return
+        except (EOFError, IOError, OSError):
+            # the worker process is dead
+            pass
+
+    def stop(self):
+        """
+        Stop the worker process.
+        """
+        try:
+            send_message(self.conn, 'stop')
+        except (IOError, OSError):
+            pass
+        self.conn.close()
+        for _ in range(10):
+            if not self.is_alive():
+                return
+            time.sleep(0.1)
+        self.process.terminate()
+        self.process.wait()
+
+
+class ProcessPool(object):
+    """
+    Worker processes of backends which are configured to run in their own
+    process, with the ``_process`` private option.
+    """
+
+    def __init__(self):
+        self.logger = getLogger('processes')
+        self.mutex = Lock()
+        self.processes = {}
+
+    def accepts(self, backend):
+        """
+        Check if a backend has to be run in a worker process.
+
+        :param backend: backend to check
+        :type backend: :class:`weboob.tools.backend.Module`
+        :rtype: :class:`bool`
+        """
+        return backend._private_config.get('_process', '').lower() in ('1', 'y', 'true', 'on', 'yes')
+
+    def call(self, backend, function, args, kwargs):
+        """
+        Call a function on a backend in its worker process, which is started
+        if needed.
+
+        See :func:`BackendProcess.call`.
+        """
+        with self.mutex:
+            process = self.processes.get(backend.name)
+            if process is None or process.backend is not backend or not process.is_alive():
+                if process is not None:
+                    process.stop()
+                self.logger.debug(u'Starting worker process of %s', backend.name)
+                process = self.processes[backend.name] = BackendProcess(backend)
+
+        return process.call(function, args, kwargs)
+
+    def stop(self, names=None):
+        """
+        Stop worker processes.
+
+        :param names: if specified, only stop processes of these backends
+        :type names: :class:`list`
+        """
+        with self.mutex:
+            if names is None:
+                names = list(self.processes)
+            for name in names:
+                process = self.processes.pop(name, None)
+                if process is not None:
+                    process.stop()
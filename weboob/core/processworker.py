@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2010-2016 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+
+import imp
+import logging
+import os
+import signal
+import socket
+import sys
+from threading import RLock
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+from weboob.core.processes import Connection, recv_message, send_error, send_message
+from weboob.tools.compat import basestring
+from weboob.tools.config.yamlconfig import YamlConfig
+from weboob.tools.storage import StandardStorage
+
+
+__all__ = ['main']
+
+
+class WorkerStorage(StandardStorage):
+    """
+    Storage of a backend in its worker process.
+
+    It is kept in memory, and its changes are sent back to the main process
+    after each call.
+
+    :param name: name of the backend
+    :type name: :class:`str`
+    :param values: values of the backend in the storage of the main process
+    :type values: :class:`dict`
+    """
+
+    def __init__(self, name, values):
+        # the file of the storage is only written by the main process
+        self.config = YamlConfig(None)
+        self.config.values = {'backends': {name: values}}
+        self.mutex = RLock()
+        self.saved = False
+
+    def save(self, what, name):
+        with self.mutex:
+            self.saved = True
+
+
+def _create_backend(package, path, module, klass, name, config, storage_values, log_level):
+    from weboob.core.ouiboube import WebNip
+
+    logging.basicConfig(level=log_level)
+    # modules are loaded as top-level packages by ModulesLoader
+    if package not in sys.modules:
+        fp, pathname, description = imp.find_module(package, [path])
+        try:
+            imp.load_module(package, fp, pathname, description)
+        finally:
+            if fp:
+                fp.close()
+    __import__(module)
+    klass = getattr(sys.modules[module], klass)
+
+    storage = None if storage_values is None else WorkerStorage(name, storage_values)
+    return klass(WebNip(modules_path=False), name, config, storage)
+
+
+def _dump_storage(backend):
+    return pickle.dumps(backend.storage.get(default={}), pickle.HIGHEST_PROTOCOL)
+
+
+def _send_storage(conn, backend, previous):
+    # Send the values of the backend in the storage if they have changed.
+    storage = backend.storage.storage
+    if storage is None:
+        return previous
+    values = _dump_storage(backend)
+    if values != previous or storage.saved:
+        send_message(conn, 'storage', pickle.loads(values), storage.saved)
+        storage.saved = False
+    return values
+
+
+def _process_run(conn):
+    # Interruptions are handled by the parent process.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    try:
+        kind, payload = recv_message(conn)
+        backend = _create_backend(*pickle.loads(payload))
+    except Exception as error:
+        send_error(conn, error)
+        return
+    send_message(conn, 'ready')
+    values = _dump_storage(backend)
+
+    while True:
+        try:
+            kind, payload = recv_message(conn)
+        except EOFError:
+            return
+
+        if kind == 'stop':
+            return
+        if kind != 'call':
+            # a cancellation received after the end of a call
+            continue
+
+        try:
+            function, args, kwargs = pickle.loads(payload)
+            if callable(function):
+                result = function(backend, *args, **kwargs)
+            else:
+                result = getattr(backend, function)(*args, **kwargs)
+
+            if hasattr(result, '__iter__') and not isinstance(result, basestring):
+                for subresult in result:
+                    send_message(conn, 'result', subresult)
+                    if conn.poll() and recv_message(conn)[0] == 'cancel':
+                        if hasattr(result, 'close'):
+                            result.close()
+                        break
+            elif result is not None:
+                send_message(conn, 'result', result)
+        except Exception as error:
+            values = _send_storage(conn, backend, values)
+            send_error(conn, error)
+        else:
+            values = _send_storage(conn, backend, values)
+            send_message(conn, 'done')
+
+
+def main():
+    """
+    Entry point of worker processes, which get their backend and calls
+    through a socket as standard input.
+    """
+    sock = socket.fromfd(0, socket.AF_UNIX, socket.SOCK_STREAM)
+    # nothing has to be read on the standard input of backends
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    os.close(devnull)
+    _process_run(Connection(sock))
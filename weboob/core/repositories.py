@@ -20,6 +20,7 @@
 
 from __future__ import print_function
 import imp
+import marshal
 import posixpath
 import shutil
 import re
@@ -27,13 +28,17 @@ import sys
 import os
 import subprocess
 import hashlib
+import tempfile
+import time
 from datetime import datetime
 from contextlib import closing
 from compileall import compile_dir
 from io import BytesIO
+from threading import Event, Lock
 
 from weboob.exceptions import BrowserHTTPError, BrowserHTTPNotFound
 from .modules import LoadedModule
+from .workers import WorkerPool
 from weboob.tools.log import getLogger
 from weboob.tools.misc import get_backtrace, to_unicode
 try:
@@ -62,6 +67,8 @@ class ModuleInfo(object):
         self.license = u''
         self.icon = u''
         self.urls = u''
+        # SHA-256 checksum of the archive, if provided by the repository
+        self.sha256 = None
 
     def load(self, items):
         self.version = int(items['version'])
@@ -71,6 +78,7 @@ class ModuleInfo(object):
         self.license = to_unicode(items['license'])
         self.icon = items['icon'].strip() or None
         self.urls = items['urls']
+        self.sha256 = items.get('sha256') or None
 
     def has_caps(self, caps):
         if not isinstance(caps, (list, tuple)):
@@ -96,8 +104,21 @@ class ModuleInfo(object):
                 ('license', self.license),
                 ('icon', self.icon or ''),
                 ('urls', self.urls),
+                ('sha256', self.sha256 or ''),
                )
 
+    def dump_cache(self):
+        """
+        Get attributes read from the index, to be cached.
+        """
+        return dict((key, value) for key, value in self.__dict__.iteritems() if key != 'path')
+
+    @classmethod
+    def load_cache(cls, data):
+        module = cls(data['name'])
+        module.__dict__.update(data)
+        return module
+
 
 class RepositoryUnavailable(Exception):
     """
@@ -121,6 +142,9 @@ class Repository(object):
         self.local = None
         self.signed = False
         self.key_update = 0
+        # validators of the last downloaded index of a remote repository
+        self.etag = None
+        self.last_modified = None
         self.logger = getLogger('repository')
 
         self.modules = {}
@@ -138,6 +162,30 @@ class Repository(object):
     def __repr__(self):
         return '<Repository %r>' % self.name
 
+    def dump_cache(self):
+        """
+        Get attributes and modules read from the index, to be cached.
+        """
+        return {'url': self.url,
+                'name': self.name,
+                'update': self.update,
+                'maintainer': self.maintainer,
+                'signed': self.signed,
+                'key_update': self.key_update,
+                'etag': self.etag,
+                'last_modified': self.last_modified,
+                'modules': [module.dump_cache() for module in self.modules.itervalues()],
+               }
+
+    @classmethod
+    def load_cache(cls, data):
+        repository = cls(data['url'])
+        for key in ('name', 'update', 'maintainer', 'signed', 'key_update', 'etag', 'last_modified'):
+            setattr(repository, key, data[key])
+        for module in data['modules']:
+            repository.modules[module['name']] = ModuleInfo.load_cache(module)
+        return repository
+
     def localurl2path(self):
         """
         Get a local path of a file:// URL.
@@ -153,6 +201,9 @@ class Repository(object):
         Retrieve the index file of this repository. It can use network
         if this is a remote repository.
 
+        If the index has already been retrieved, it is only downloaded
+        again if it has been modified since.
+
         :param repo_path: path to save the downloaded index file.
         :type repo_path: str
         """
@@ -168,13 +219,30 @@ class Repository(object):
                 fp = open(filename, 'r')
         else:
             # This is a remote repository, download file
+            headers = {}
+            if self.modules:
+                if self.etag:
+                    headers['If-None-Match'] = self.etag
+                if self.last_modified:
+                    headers['If-Modified-Since'] = self.last_modified
             try:
-                fp = BytesIO(browser.open(posixpath.join(self.url, self.INDEX)).content)
+                response = browser.open(posixpath.join(self.url, self.INDEX), headers=headers)
             except BrowserHTTPError as e:
                 raise RepositoryUnavailable(unicode(e))
 
+            if response.status_code == 304:
+                # Not modified, keep the modules we already know.
+                self.save(repo_path, private=True)
+                return
+
+            fp = BytesIO(response.content)
+
         self.parse_index(fp)
 
+        if not self.local:
+            self.etag = response.headers.get('ETag')
+            self.last_modified = response.headers.get('Last-Modified')
+
         if self.local:
             # Always rebuild index of a local repository.
             self.build_index(self.localurl2path(), filename)
@@ -228,6 +296,8 @@ class Repository(object):
             self.maintainer = items['maintainer']
             self.signed = bool(int(items.get('signed', '0')))
             self.key_update = int(items.get('key_update', '0'))
+            self.etag = items.get('etag')
+            self.last_modified = items.get('last_modified')
         except KeyError as e:
             raise RepositoryUnavailable('Missing global parameters in repository: %s' % e)
         except ValueError as e:
@@ -257,12 +327,16 @@ class Repository(object):
         """
         Rebuild index of modules of repository.
 
+        Modules which are already known with the same version (the
+        modification time of their tree) are not imported again.
+
         :param path: path of the repository
         :type path: str
         :param filename: file to save index
         :type filename: str
         """
         print('Rebuild index')
+        previous = dict(self.modules)
         self.modules.clear()
 
         if os.path.isdir(os.path.join(path, self.KEYDIR)):
@@ -277,6 +351,11 @@ class Repository(object):
             if not os.path.isdir(module_path) or '.' in name or name == self.KEYDIR:
                 continue
 
+            version = self.get_tree_mtime(module_path)
+            if name in previous and previous[name].version == version:
+                self.modules[name] = previous[name]
+                continue
+
             try:
                 fp, pathname, description = imp.find_module(name, [path])
                 try:
@@ -289,7 +368,7 @@ class Repository(object):
                 self.logger.debug(get_backtrace(e))
             else:
                 m = ModuleInfo(module.name)
-                m.version = self.get_tree_mtime(module_path)
+                m.version = version
                 m.capabilities = list(set([c.__name__ for c in module.iter_caps()]))
                 m.description = module.description
                 m.maintainer = module.maintainer
@@ -331,6 +410,10 @@ class Repository(object):
         config.set(DEFAULTSECT, 'key_update', self.key_update)
         if private:
             config.set(DEFAULTSECT, 'url', self.url)
+            if self.etag:
+                config.set(DEFAULTSECT, 'etag', self.etag)
+            if self.last_modified:
+                config.set(DEFAULTSECT, 'last_modified', self.last_modified)
 
         for module in self.modules.itervalues():
             config.add_section(module.name)
@@ -421,18 +504,30 @@ http://updates.weboob.org/%(version)s/main/
 
 class Repositories(object):
     SOURCES_LIST = 'sources.list'
+    # binary cache of the parsed indexes of repositories
+    CACHE = 'repositories.cache'
+    CACHE_VERSION = 2
+    # number of modules downloaded and checked at once by update(), which
+    # should not exceed the size of the connections pool of the browser
+    INSTALL_WORKERS = 8
+    # archives of modules which have not been used for this number of
+    # days are removed from the cache after an update
+    TARBALLS_MAX_AGE = 30
     MODULES_DIR = 'modules'
     REPOS_DIR = 'repositories'
     KEYRINGS_DIR = 'keyrings'
     ICONS_DIR = 'icons'
+    TARBALLS_DIR = 'tarballs'
 
-    SHARE_DIRS = [MODULES_DIR, REPOS_DIR, KEYRINGS_DIR, ICONS_DIR]
+    SHARE_DIRS = [MODULES_DIR, REPOS_DIR, KEYRINGS_DIR, ICONS_DIR, TARBALLS_DIR]
 
     def __init__(self, workdir, datadir, version):
         self.logger = getLogger('repositories')
         self.version = version
 
         self.browser = None
+        # modules are set up one at a time
+        self.install_mutex = Lock()
 
         self.workdir = workdir
         self.datadir = datadir
@@ -441,12 +536,14 @@ class Repositories(object):
         self.repos_dir = os.path.join(self.datadir, self.REPOS_DIR)
         self.keyrings_dir = os.path.join(self.datadir, self.KEYRINGS_DIR)
         self.icons_dir = os.path.join(self.datadir, self.ICONS_DIR)
+        self.tarballs_dir = os.path.join(self.datadir, self.TARBALLS_DIR)
 
         self.create_dir(self.datadir)
         self.create_dir(self.modules_dir)
         self.create_dir(self.repos_dir)
         self.create_dir(self.keyrings_dir)
         self.create_dir(self.icons_dir)
+        self.create_dir(self.tarballs_dir)
 
         self.versions = Versions(self.modules_dir)
 
@@ -516,6 +613,11 @@ class Repositories(object):
         Load repositories from ~/.local/share/weboob/repositories/.
         """
         self.repositories = []
+        sources = self._get_cache_sources()
+        if self._load_cache(sources):
+            return
+
+        failed = False
         for name in sorted(os.listdir(self.repos_dir)):
             path = os.path.join(self.repos_dir, name)
             try:
@@ -523,6 +625,47 @@ class Repositories(object):
                 self.repositories.append(repository)
             except RepositoryUnavailable as e:
                 print('Unable to load repository %s (%s), try to update repositories.' % (name, e), file=sys.stderr)
+                failed = True
+
+        if not failed:
+            self._save_cache(sources)
+
+    def _get_cache_sources(self):
+        # the cache is valid as long as these files are not modified
+        sources = []
+        for name in sorted(os.listdir(self.repos_dir)):
+            st = os.stat(os.path.join(self.repos_dir, name))
+            sources.append((name, st.st_mtime, st.st_size))
+        return sources
+
+    def _load_cache(self, sources):
+        try:
+            with open(os.path.join(self.modules_dir, self.CACHE), 'rb') as f:
+                data = marshal.load(f)
+            if data['version'] != self.CACHE_VERSION or data['sources'] != sources:
+                return False
+            self.repositories = [Repository.load_cache(repository) for repository in data['repositories']]
+        except IOError:
+            return False
+        except Exception:
+            # corrupted, or written by another version of Python
+            self.logger.debug('Unable to load the repositories cache: %s' % get_backtrace())
+            self.repositories = []
+            return False
+        return True
+
+    def _save_cache(self, sources):
+        data = {'version': self.CACHE_VERSION,
+                'sources': sources,
+                'repositories': [repository.dump_cache() for repository in self.repositories],
+               }
+        try:
+            # write in a temporary file to avoid corruption problems
+            with tempfile.NamedTemporaryFile(dir=self.modules_dir, delete=False) as f:
+                f.write(marshal.dumps(data))
+            os.rename(f.name, os.path.join(self.modules_dir, self.CACHE))
+        except (IOError, OSError, ValueError) as e:
+            self.logger.warning('Unable to save the repositories cache: %s' % e)
 
     def get_module_icon_path(self, module):
         return os.path.join(self.icons_dir, '%s.png' % module.name)
@@ -574,6 +717,11 @@ class Repositories(object):
         :param progress: observer object.
         :type progress: :class:`IProgress`
         """
+        # indexes already retrieved, which are downloaded again only if
+        # they have been modified
+        previous = dict((repository.url, repository) for repository in self.repositories
+                        if repository.local is False)
+
         self.repositories = []
         for name in os.listdir(self.repos_dir):
             os.remove(os.path.join(self.repos_dir, name))
@@ -581,7 +729,7 @@ class Repositories(object):
         gpgv = Keyring.find_gpgv()
         for line in self._parse_source_list():
             progress.progress(0.0, 'Getting %s' % line)
-            repository = Repository(line)
+            repository = previous.pop(line, None) or Repository(line)
             filename = self.url2filename(repository.url)
             prio_filename = '%02d-%s' % (len(self.repositories), filename)
             repo_path = os.path.join(self.repos_dir, prio_filename)
@@ -629,22 +777,112 @@ class Repositories(object):
 
         if len(to_update) == 0:
             progress.progress(1.0, 'All modules are up-to-date.')
+            self.clean_tarballs()
             return
 
+        # Modules are downloaded and their signatures checked in parallel,
+        # and the global progress is the mean of the progress of each one.
+        done = [0.0] * len(to_update)
+        mutex = Lock()
+
         class InstallProgress(PrintProgress):
             def __init__(self, n):
                 self.n = n
 
             def progress(self, percent, message):
-                progress.progress(float(self.n)/len(to_update) + 1.0/len(to_update)*percent, message)
+                with mutex:
+                    done[self.n] = percent
+                    progress.progress(sum(done) / len(to_update), '%s: %s' % (to_update[self.n].name, message))
 
-        for n, info in enumerate(to_update):
+        def install(n):
+            if cancelled.is_set():
+                return
             inst_progress = InstallProgress(n)
             try:
-                self.install(info, inst_progress)
+                self.install(to_update[n], inst_progress)
             except ModuleInstallError as e:
                 inst_progress.progress(1.0, unicode(e))
 
+        self.load_browser()
+        cancelled = Event()
+        workers = WorkerPool(self.INSTALL_WORKERS, name='install')
+        try:
+            workers.map(install, xrange(len(to_update)))
+        except BaseException:
+            # on KeyboardInterrupt, do not start the pending installations
+            # and do not wait for the running ones
+            cancelled.set()
+            workers.shutdown(wait=False)
+            raise
+        workers.shutdown()
+
+        self.clean_tarballs()
+
+    def clean_tarballs(self):
+        """
+        Remove archives of modules which have not been used for
+        TARBALLS_MAX_AGE days from the cache.
+        """
+        limit = time.time() - self.TARBALLS_MAX_AGE * 86400
+        for name in os.listdir(self.tarballs_dir):
+            path = os.path.join(self.tarballs_dir, name)
+            try:
+                if os.path.getmtime(path) < limit:
+                    os.remove(path)
+            except OSError as e:
+                self.logger.warning('Unable to remove %s: %s' % (path, e))
+
+    def retrieve_tarball(self, module, progress=PrintProgress()):
+        """
+        Get the archive of a module from the cache, or download it.
+
+        Archives are stored in ~/.local/share/weboob/tarballs/ and named after
+        their SHA-256 checksum, so when the repository provides it in its
+        index, an archive is only downloaded once. Other archives could not
+        be found in the cache, so they are temporary files which the caller
+        has to remove.
+
+        :param module: module to retrieve
+        :type module: :class:`ModuleInfo`
+        :param progress: observer object
+        :type progress: :class:`IProgress`
+        :returns: path to the archive
+        :rtype: :class:`str`
+        """
+        if module.sha256:
+            path = os.path.join(self.tarballs_dir, '%s.tar.gz' % module.sha256)
+            if os.path.exists(path):
+                progress.progress(0.2, 'Using cached archive...')
+                # keep it in the cache
+                os.utime(path, None)
+                return path
+
+        progress.progress(0.2, 'Downloading module...')
+        checksum = hashlib.sha256()
+        f = tempfile.NamedTemporaryFile(dir=self.tarballs_dir, delete=False)
+        try:
+            with f:
+                try:
+                    with closing(self.browser.open(module.url, stream=True)) as response:
+                        for chunk in response.iter_content(64 * 1024):
+                            checksum.update(chunk)
+                            f.write(chunk)
+                except BrowserHTTPError as e:
+                    raise ModuleInstallError('Unable to fetch module: %s' % e)
+
+            if module.sha256 and checksum.hexdigest() != module.sha256:
+                raise ModuleInstallError('Invalid checksum for %s.' % module.name)
+        except:
+            os.remove(f.name)
+            raise
+
+        if not module.sha256:
+            return f.name
+
+        path = os.path.join(self.tarballs_dir, '%s.tar.gz' % module.sha256)
+        os.rename(f.name, path)
+        return path
+
     def install(self, module, progress=PrintProgress()):
         """
         Install a module.
@@ -681,35 +919,36 @@ class Repositories(object):
         else:
             raise ModuleInstallError('The latest version of %s is already installed' % module.name)
 
-        progress.progress(0.2, 'Downloading module...')
+        tarball = self.retrieve_tarball(module, progress)
         try:
-            tardata = self.browser.open(module.url).content
-        except BrowserHTTPError as e:
-            raise ModuleInstallError('Unable to fetch module: %s' % e)
-
-        # Check signature
-        if module.signed and Keyring.find_gpgv():
-            progress.progress(0.5, 'Checking module authenticity...')
-            sig_data = self.browser.open(posixpath.join(module.url + '.sig')).content
-            keyring_path = os.path.join(self.keyrings_dir, self.url2filename(module.repo_url))
-            keyring = Keyring(keyring_path)
-            if not keyring.exists():
-                raise ModuleInstallError('No keyring found, please update repos.')
-            if not keyring.is_valid(tardata, sig_data):
-                raise ModuleInstallError('Invalid signature for %s.' % module.name)
-
-        # Extract module from tarball.
-        if os.path.isdir(module_dir):
-            shutil.rmtree(module_dir)
-        progress.progress(0.7, 'Setting up module...')
-        with closing(tarfile.open('', 'r:gz', BytesIO(tardata))) as tar:
-            tar.extractall(self.modules_dir)
-        if not os.path.isdir(module_dir):
-            raise ModuleInstallError('The archive for %s looks invalid.' % module.name)
-        # Precompile
-        compile_dir(module_dir, quiet=True)
-
-        self.versions.set(module.name, module.version)
+            # Check signature
+            if module.signed and Keyring.find_gpgv():
+                progress.progress(0.5, 'Checking module authenticity...')
+                sig_data = self.browser.open(posixpath.join(module.url + '.sig')).content
+                keyring_path = os.path.join(self.keyrings_dir, self.url2filename(module.repo_url))
+                keyring = Keyring(keyring_path)
+                if not keyring.exists():
+                    raise ModuleInstallError('No keyring found, please update repos.')
+                with open(tarball, 'rb') as f:
+                    if not keyring.is_valid(f, sig_data):
+                        raise ModuleInstallError('Invalid signature for %s.' % module.name)
+
+            with self.install_mutex:
+                # Extract module from tarball.
+                if os.path.isdir(module_dir):
+                    shutil.rmtree(module_dir)
+                progress.progress(0.7, 'Setting up module...')
+                with closing(tarfile.open(tarball, 'r:gz')) as tar:
+                    tar.extractall(self.modules_dir)
+                if not os.path.isdir(module_dir):
+                    raise ModuleInstallError('The archive for %s looks invalid.' % module.name)
+                # Precompile
+                compile_dir(module_dir, quiet=True)
+
+                self.versions.set(module.name, module.version)
+        finally:
+            if not module.sha256:
+                os.remove(tarball)
 
         progress.progress(0.9, 'Downloading icon...')
         self.retrieve_icon(module)
@@ -781,7 +1020,7 @@ class Keyring(object):
     def is_valid(self, data, sigdata):
         """
         Check if the data is signed by an accepted key.
-        data and sigdata should be strings.
+        data should be a string or a file, and sigdata a string.
         """
         gpgv = self.find_gpgv()
         from tempfile import NamedTemporaryFile
@@ -793,14 +1032,18 @@ class Keyring(object):
             try:
                 sigfile.write(sigdata)
                 sigfile.flush()  # very important
-                assert isinstance(data, basestring)
+                if isinstance(data, basestring):
+                    stdin = subprocess.PIPE
+                else:
+                    # gpgv reads the file itself
+                    stdin, data = data, None
                 # Yes, all of it is necessary
                 proc = subprocess.Popen([gpgv,
                         '--status-fd', '1',
                         '--keyring', os.path.realpath(self.path),
                         os.path.realpath(sigfile.name),
                         '-'],
-                    stdin=subprocess.PIPE,
+                    stdin=stdin,
                     stdout=subprocess.PIPE,
                     stderr=subprocess.PIPE)
                 out, err = proc.communicate(data)
@@ -20,24 +20,30 @@
 
 from __future__ import print_function
 
-from threading import Event, RLock
+import errno
+import os
+import random
+import select
+from time import time
+from threading import Condition, Event, Lock, RLock, Thread, current_thread, _MainThread
 try:
     from threading import _Timer as Timer
 except ImportError:
     from threading import Timer
 
+from weboob.core.workers import WorkerPool
 from weboob.tools.log import getLogger
 from weboob.tools.misc import get_backtrace
 
 
-__all__ = ['Scheduler']
+__all__ = ['Scheduler', 'HeapScheduler']
 
 
 class IScheduler(object):
     def schedule(self, interval, function, *args):
         raise NotImplementedError()
 
-    def repeat(self, interval, function, *args):
+    def repeat(self, interval, function, *args, **kwargs):
         raise NotImplementedError()
 
     def cancel(self, ev):
@@ -50,6 +56,49 @@ class IScheduler(object):
         raise NotImplementedError()
 
 
+class StopEvent(object):
+    """
+    Event which can be waited for by the main thread without polling.
+
+    Blocking on a lock is not interruptible by signals with Python 2, so
+    the main thread waits on a pipe with select(), which is woken up both by
+    :func:`set` and by signals like SIGINT: a KeyboardInterrupt is still
+    raised.
+    """
+
+    def __init__(self):
+        self.event = Event()
+        self.mutex = Lock()
+        self.pipe = None
+
+    def is_set(self):
+        return self.event.is_set()
+
+    isSet = is_set
+
+    def set(self):
+        with self.mutex:
+            self.event.set()
+            if self.pipe is not None:
+                os.write(self.pipe[1], b'x')
+
+    def wait(self, timeout=None):
+        if timeout is not None or os.name != 'posix' or not isinstance(current_thread(), _MainThread):
+            return self.event.wait(timeout)
+
+        with self.mutex:
+            if self.pipe is None:
+                self.pipe = os.pipe()
+
+        while not self.event.is_set():
+            try:
+                select.select([self.pipe[0]], [], [])
+            except select.error as e:
+                if e.args[0] != errno.EINTR:
+                    raise
+        return True
+
+
 class RepeatedTimer(Timer):
     def run(self):
         while not self.finished.isSet():
@@ -66,14 +115,15 @@ class Scheduler(IScheduler):
     def __init__(self):
         self.logger = getLogger('scheduler')
         self.mutex = RLock()
-        self.stop_event = Event()
+        self.stop_event = StopEvent()
         self.count = 0
         self.queue = {}
 
     def schedule(self, interval, function, *args):
         return self._schedule(Timer, interval, self._schedule_callback, function, *args)
 
-    def repeat(self, interval, function, *args):
+    def repeat(self, interval, function, *args, **kwargs):
+        # jobs are not saved, so options of HeapScheduler.repeat() are ignored
         return self._schedule(RepeatedTimer, interval, self._repeat_callback, function, *args)
 
     def _schedule(self, klass, interval, meta_func, function, *args):
@@ -123,8 +173,8 @@ class Scheduler(IScheduler):
 
     def run(self):
         try:
-            while True:
-                self.stop_event.wait(0.1)
+            # Block until want_stop() is called, or an interruption.
+            self.stop_event.wait()
         except KeyboardInterrupt:
             self._wait_to_stop()
             raise
@@ -140,3 +190,294 @@ class Scheduler(IScheduler):
                 # Contrary to _wait_to_stop(), don't call t.join
                 # because want_stop() have to be non-blocking.
             self.queue = {}
+
+
+class RepeatedJob(object):
+    """
+    State of a function repeated by :class:`HeapScheduler`.
+    """
+
+    def __init__(self, name=None, jitter=None, missed='once'):
+        self.name = name
+        self.jitter = jitter
+        self.missed = missed
+        # time of the last call, or None if it has never been called
+        self.last_run = None
+        # number of missed calls still to run
+        self.catch_up = 0
+
+    def delay(self, default=0):
+        """
+        Get a random delay to add before a call.
+
+        :param default: maximum delay if the job has no jitter
+        :type default: :class:`float`
+        """
+        jitter = default if self.jitter is None else self.jitter
+        if not jitter:
+            return 0
+        return random.uniform(0, jitter)
+
+
+class HeapScheduler(IScheduler):
+    """
+    Scheduler which uses a single timer thread and a heap of pending events.
+
+    Callbacks are run in a bounded pool of worker threads. Scheduling and
+    cancelling an event take O(log n).
+
+    A repeated function is called immediately, and then every *interval*
+    seconds after the end of the previous call.
+
+    With a storage, named repeated jobs save the time of their last call,
+    and are resumed on their previous schedule after a restart, instead of
+    being all called at once.
+
+    :param max_workers: maximum number of threads running callbacks
+    :type max_workers: :class:`int`
+    :param storage: storage where named jobs are saved
+    :type storage: :class:`weboob.tools.storage.IStorage`
+    """
+    MAX_WORKERS = 10
+
+    # Policies for calls missed while the process was not running.
+    MISSED_SKIP = 'skip'
+    MISSED_ONCE = 'once'
+    MISSED_CATCH_UP = 'catch-up'
+
+    # Maximum number of missed calls to run with MISSED_CATCH_UP.
+    MAX_CATCH_UP = 10
+
+    # Maximum random delay before the first missed call of a job without
+    # jitter, so that jobs are not all called at once after a restart.
+    MISSED_JITTER = 60
+
+    def __init__(self, max_workers=None, storage=None):
+        self.logger = getLogger('scheduler')
+        self.condition = Condition(RLock())
+        self.stop_event = StopEvent()
+        self.workers = WorkerPool(max_workers or self.MAX_WORKERS, name='scheduler')
+        self.thread = None
+        self.count = 0
+        # ids of events, by (time, id), in a binary heap
+        self.heap = []
+        # position of events in the heap, by id
+        self.positions = {}
+        # (interval, function, args, job) of events, by id
+        self.events = {}
+
+        # it can be set until named jobs are repeated
+        self.storage = storage
+        self.storage_mutex = Lock()
+
+    def schedule(self, interval, function, *args):
+        return self._schedule(interval, interval, function, args, None)
+
+    def repeat(self, interval, function, *args, **kwargs):
+        """
+        Repeat a call to a function.
+
+        :param interval: interval between two calls
+        :type interval: int
+        :param function: function to call
+        :type function: callable
+        :param args: arguments to give to function
+        :param name: name under which the time of the last call is saved in
+                     the storage (optional)
+        :type name: :class:`str`
+        :param jitter: maximum random delay added before each call, in
+                       seconds; by default, only the first call missed since
+                       the last one saved is delayed, by at most
+                       :attr:`MISSED_JITTER` seconds
+        :type jitter: :class:`float`
+        :param missed: what to do when calls have been missed since the last
+                       one saved: :attr:`MISSED_SKIP` waits for the next
+                       one, :attr:`MISSED_ONCE` calls the function once,
+                       :attr:`MISSED_CATCH_UP` calls it once per missed call
+                       (at most :attr:`MAX_CATCH_UP` times)
+        :returns: an event identificator
+        """
+        job = RepeatedJob(kwargs.pop('name', None), kwargs.pop('jitter', None), kwargs.pop('missed', self.MISSED_ONCE))
+        if kwargs:
+            raise TypeError('repeat() got unexpected keyword arguments: %s' % ', '.join(kwargs))
+        if job.missed not in (self.MISSED_SKIP, self.MISSED_ONCE, self.MISSED_CATCH_UP):
+            raise ValueError('Unknown policy for missed calls: %r' % job.missed)
+
+        return self._schedule(self._first_delay(job, interval), interval, function, args, job)
+
+    def _first_delay(self, job, interval):
+        if job.name is not None and self.storage is not None:
+            with self.storage_mutex:
+                self.storage.load('scheduler', 'jobs', {})
+                job.last_run = self.storage.get('scheduler', 'jobs', job.name, 'last_run', default=None)
+
+        if job.last_run is None:
+            return job.delay()
+
+        now = time()
+        missed = int((now - job.last_run) // interval)
+        if missed < 1:
+            # the clock may have gone backward
+            return max(0, min(interval, job.last_run + interval - now)) + job.delay()
+
+        if job.missed == self.MISSED_SKIP:
+            return job.last_run + (missed + 1) * interval - now + job.delay()
+
+        if job.missed == self.MISSED_CATCH_UP:
+            job.catch_up = min(missed, self.MAX_CATCH_UP)
+            job.last_run += (missed - job.catch_up) * interval
+        return job.delay(min(interval, self.MISSED_JITTER))
+
+    def _save_job(self, job):
+        with self.storage_mutex:
+            self.storage.set('scheduler', 'jobs', job.name, 'last_run', job.last_run)
+            self.storage.save('scheduler', 'jobs')
+
+    def _schedule(self, delay, interval, function, args, job):
+        if self.stop_event.is_set():
+            return
+
+        with self.condition:
+            self.count += 1
+            self.logger.debug('function "%s" will be called in %s seconds' % (function.__name__, delay))
+            self.events[self.count] = (interval, function, args, job)
+            self._push(time() + delay, self.count)
+
+            if self.thread is None:
+                self.thread = Thread(target=self._timer_run, name='scheduler')
+                self.thread.daemon = True
+                self.thread.start()
+            return self.count
+
+    def cancel(self, ev):
+        with self.condition:
+            try:
+                interval, function, args, job = self.events.pop(ev)
+            except KeyError:
+                return False
+
+            if ev in self.positions:
+                self._remove(ev)
+            self.logger.debug('scheduled function "%s" is canceled' % function.__name__)
+            return True
+
+    def _timer_run(self):
+        with self.condition:
+            while not self.stop_event.is_set():
+                if not self.heap:
+                    self.condition.wait()
+                    continue
+
+                delay = self.heap[0][0] - time()
+                if delay > 0:
+                    self.condition.wait(delay)
+                    continue
+
+                when, ev = self._remove_at(0)
+                interval, function, args, job = self.events[ev]
+                if job is None:
+                    del self.events[ev]
+                self.workers.submit(self._run_event, ev, interval, function, args, job)
+
+    def _run_event(self, ev, interval, function, args, job):
+        start = time()
+        try:
+            function(*args)
+        except Exception:
+            # do not stop a repeated event because of an exception
+            self.logger.error('Error in scheduled function "%s": %s' % (function.__name__, get_backtrace()))
+
+        if job is None:
+            return
+
+        if job.catch_up > 0:
+            # record the time at which the missed call was expected
+            job.catch_up -= 1
+            job.last_run += interval
+        else:
+            job.last_run = start
+        if job.name is not None and self.storage is not None:
+            self._save_job(job)
+
+        with self.condition:
+            if ev in self.events and not self.stop_event.is_set():
+                delay = 0 if job.catch_up > 0 else interval + job.delay()
+                self.logger.debug('function "%s" will be called in %s seconds' % (function.__name__, delay))
+                self._push(time() + delay, ev)
+
+    # Binary heap, with the position of each event kept up to date so that
+    # any event can be removed in O(log n).
+
+    def _push(self, when, ev):
+        self.heap.append((when, ev))
+        self.positions[ev] = len(self.heap) - 1
+        self._sift_up(len(self.heap) - 1)
+        if self.positions[ev] == 0:
+            # the timer thread has to wait less
+            self.condition.notify()
+
+    def _remove(self, ev):
+        self._remove_at(self.positions[ev])
+
+    def _remove_at(self, pos):
+        item = self.heap[pos]
+        del self.positions[item[1]]
+        last = self.heap.pop()
+        if pos < len(self.heap):
+            self.heap[pos] = last
+            self.positions[last[1]] = pos
+            self._sift_down(pos)
+            self._sift_up(pos)
+        return item
+
+    def _swap(self, i, j):
+        heap = self.heap
+        heap[i], heap[j] = heap[j], heap[i]
+        self.positions[heap[i][1]] = i
+        self.positions[heap[j][1]] = j
+
+    def _sift_up(self, pos):
+        while pos > 0:
+            parent = (pos - 1) // 2
+            if self.heap[pos] >= self.heap[parent]:
+                break
+            self._swap(pos, parent)
+            pos = parent
+
+    def _sift_down(self, pos):
+        size = len(self.heap)
+        while True:
+            child = 2 * pos + 1
+            if child >= size:
+                break
+            if child + 1 < size and self.heap[child + 1] < self.heap[child]:
+                child += 1
+            if self.heap[pos] <= self.heap[child]:
+                break
+            self._swap(pos, child)
+            pos = child
+
+    def _wait_to_stop(self):
+        self.want_stop()
+        if self.thread is not None:
+            self.thread.join()
+        self.workers.shutdown(wait=True)
+
+    def run(self):
+        try:
+            # Block until want_stop() is called, or an interruption.
+            self.stop_event.wait()
+        except KeyboardInterrupt:
+            self._wait_to_stop()
+            raise
+        else:
+            self._wait_to_stop()
+        return True
+
+    def want_stop(self):
+        self.stop_event.set()
+        with self.condition:
+            self.heap = []
+            self.positions = {}
+            self.events = {}
+            self.condition.notify()
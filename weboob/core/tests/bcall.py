@@ -0,0 +1,352 @@
+# -*- coding: utf-8 -*-
+# Copyright(C) 2016 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+import os
+import shutil
+import sys
+import tempfile
+import time
+import traceback
+from itertools import islice
+from unittest import TestCase
+
+from weboob.capabilities.base import BaseObject
+from weboob.core.bcall import BackendsCall, CallErrors, CallTimeout
+from weboob.core.ouiboube import WebNip
+from weboob.core.processes import BackendProcessError
+from weboob.core.workers import WorkerPool
+from weboob.tools.application.base import CompleteCall
+from weboob.tools.backend import Module
+from weboob.tools.cancellation import check_cancelled
+from weboob.tools.storage import StandardStorage
+
+
+# Mock that allows to represent an exception which can't be unpickled
+class MyError(Exception):
+    def __init__(self, code, message):
+        Exception.__init__(self, u'%s: %s' % (code, message))
+
+
+# Mock that allows to represent a module
+class MyMockModule(Module):
+    NAME = 'mock'
+
+    def iter_things(self, count):
+        for i in xrange(count):
+            yield BaseObject(str(i))
+
+    def get_thing(self, id):
+        return BaseObject(id)
+
+    def fail(self):
+        raise ValueError('fail')
+
+    def fail_badly(self):
+        raise MyError(42, 'fail')
+
+    def get_slowly(self, id):
+        self._calls.append(id)
+        time.sleep(0.2)
+        return BaseObject(id)
+
+    def get_pid(self):
+        self._count = getattr(self, '_count', 0) + 1
+        return BaseObject(u'%s-%s' % (os.getpid(), self._count))
+
+    def set_value(self, value):
+        self.storage.set('value', value)
+        self.storage.save()
+
+    def wait_cancelled(self):
+        # like a browser, which checks the cancellation before each request
+        for _ in xrange(500):
+            check_cancelled()
+            time.sleep(0.01)
+
+    def iter_forever(self, stopped):
+        try:
+            i = 0
+            while True:
+                yield BaseObject(str(i))
+                i += 1
+                time.sleep(0.01)
+        finally:
+            stopped.append(self.name)
+
+
+# Mock that allows to represent a module which never answers in time
+class MySlowMockModule(MyMockModule):
+    def iter_things(self, count):
+        time.sleep(1)
+        return MyMockModule.iter_things(self, count)
+
+
+# Mock that allows to represent the session of a browser
+class MyMockSession(object):
+    closed = False
+
+    def close(self):
+        self.closed = True
+
+
+# Mock that allows to represent a browser
+class MyMockBrowser(object):
+    def __init__(self, **kwargs):
+        self.session = MyMockSession()
+
+
+# Mock that allows to represent a module which accepts concurrent calls
+class MyConcurrentMockModule(MyMockModule):
+    BROWSER = MyMockBrowser
+    CONCURRENT_CALLS = 3
+
+    def __init__(self, *args, **kwargs):
+        MyMockModule.__init__(self, *args, **kwargs)
+        self.started = []
+        self.browsers = []
+        self.ended_before_deinit = None
+
+    def get_browser(self):
+        self.started.append(self.name)
+        time.sleep(0.2)
+        self.browsers.append(self.browser)
+        return BaseObject(str(id(self.browser)))
+
+    def deinit(self):
+        self.ended_before_deinit = len(self.browsers)
+        MyMockModule.deinit(self)
+
+
+# Class that tests calls on several backends
+class BackendsCallTest(TestCase):
+
+    def setUp(self):
+        self.weboob = WebNip(modules_path=False, max_workers=4)
+        for i in xrange(10):
+            name = 'mock%d' % i
+            self.weboob.backend_instances[name] = MyMockModule(self.weboob, name)
+
+    def tearDown(self):
+        self.weboob.deinit()
+
+    def test_iter(self):
+        objs = list(self.weboob.do('iter_things', 3))
+        self.assertEqual(len(objs), 30)
+        self.assertEqual(set(obj.backend for obj in objs), set(self.weboob.backend_instances))
+
+    def test_single_result(self):
+        objs = list(self.weboob.do('get_thing', 'abc', backends='mock3'))
+        self.assertEqual([(obj.id, obj.backend) for obj in objs], [('abc', 'mock3')])
+
+    def test_errors(self):
+        with self.assertRaises(CallErrors) as cm:
+            list(self.weboob.do('fail'))
+        self.assertEqual(len(cm.exception.errors), 10)
+
+    def test_workers_reused(self):
+        for _ in xrange(5):
+            list(self.weboob.do('iter_things', 1))
+        self.assertLessEqual(self.weboob.workers.created, 4)
+
+    def test_workers_count(self):
+        # a worker which has just finished is reused by the next call
+        pool = WorkerPool()
+        backends = list(self.weboob.backend_instances.values())
+        for _ in xrange(50):
+            BackendsCall(backends, lambda backend: time.sleep(0.005), pool=pool).wait()
+        self.assertEqual(pool.created, 10)
+        pool.shutdown()
+
+    def test_workers_map(self):
+        start = time.time()
+        self.assertEqual(self.weboob.workers.map(lambda i: time.sleep(0.1) or i * 2, xrange(4)), [0, 2, 4, 6])
+        self.assertLess(time.time() - start, 0.3)
+        try:
+            self.weboob.workers.map(lambda i: 1 // i, xrange(4))
+        except ZeroDivisionError:
+            # the traceback of the call is kept
+            self.assertIn('<lambda>', [frame[2] for frame in traceback.extract_tb(sys.exc_info()[2])])
+        else:
+            self.fail('ZeroDivisionError not raised')
+
+    def test_callback_thread(self):
+        results = []
+        finished = []
+        thread = self.weboob.do('iter_things', 2).callback_thread(results.append,
+                                                                 finishback=lambda: finished.append(True))
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(len(results), 20)
+        self.assertEqual(finished, [True])
+
+    def test_timeout(self):
+        self.weboob.backend_instances['slow'] = MySlowMockModule(self.weboob, 'slow')
+        start = time.time()
+        with self.assertRaises(CallErrors) as cm:
+            objs = []
+            for obj in self.weboob.do('iter_things', 1, timeout=0.2):
+                objs.append(obj)
+        self.assertLess(time.time() - start, 1)
+        self.assertEqual(len(objs), 10)
+        self.assertEqual([(backend.name, type(error)) for backend, error, _ in cm.exception.errors],
+                         [('slow', CallTimeout)])
+
+    def test_wait_timeout(self):
+        self.weboob.backend_instances['slow'] = MySlowMockModule(self.weboob, 'slow')
+        with self.assertRaises(CallErrors) as cm:
+            self.weboob.do('iter_things', 1, timeout=0.2).wait()
+        self.assertEqual([backend.name for backend, _, _ in cm.exception.errors], ['slow'])
+
+    def test_timeout_cancels(self):
+        start = time.time()
+        with self.assertRaises(CallErrors):
+            self.weboob.do('wait_cancelled', backends='mock1', timeout=0.2).wait()
+        # the late call does not hold the backend anymore
+        self.assertEqual(len(list(self.weboob.do('get_thing', 'a', backends='mock1', timeout=1))), 1)
+        self.weboob.deinit()
+        self.assertLess(time.time() - start, 1)
+
+    def test_cancel_on_close(self):
+        stopped = []
+        objs = list(islice(self.weboob.do('iter_forever', stopped, backends='mock1'), 3))
+        self.assertEqual(len(objs), 3)
+        for _ in xrange(100):
+            if stopped:
+                break
+            time.sleep(0.01)
+        self.assertEqual(stopped, ['mock1'])
+
+    def test_queue_size(self):
+        stopped = []
+        call = self.weboob.do('iter_forever', stopped, backends=['mock1', 'mock2'], queue_size=5)
+        it = iter(call)
+        for _ in xrange(10):
+            next(it)
+            time.sleep(0.05)
+            self.assertLessEqual(call.responses.qsize(), 5)
+        it.close()
+        for _ in xrange(100):
+            if len(stopped) == 2:
+                break
+            time.sleep(0.01)
+        self.assertEqual(sorted(stopped), ['mock1', 'mock2'])
+
+    def test_process(self):
+        self.weboob.backend_instances['proc'] = MyMockModule(self.weboob, 'proc', {'_process': 'yes'})
+        objs = [list(self.weboob.do('get_pid', backends='proc'))[0] for _ in xrange(2)]
+        pids = set(obj.id.split('-')[0] for obj in objs)
+        self.assertEqual(len(pids), 1)
+        self.assertNotEqual(pids.pop(), str(os.getpid()))
+        self.assertEqual([obj.id.split('-')[1] for obj in objs], ['1', '2'])
+
+        self.assertEqual(len(list(self.weboob.do('iter_things', 5, backends='proc'))), 5)
+
+        with self.assertRaises(CallErrors) as cm:
+            list(self.weboob.do('fail', backends='proc'))
+        backend, error, backtrace = cm.exception.errors[0]
+        self.assertIsInstance(error, ValueError)
+        self.assertIn('fail', backtrace)
+
+        with self.assertRaises(CallErrors) as cm:
+            list(self.weboob.do('fail_badly', backends='proc'))
+        backend, error, backtrace = cm.exception.errors[0]
+        self.assertIsInstance(error, BackendProcessError)
+        self.assertIn('MyError', unicode(error))
+        self.assertIn('fail_badly', backtrace)
+
+        # completion of objects is run in the process too
+        obj = list(self.weboob.do(CompleteCall(None, None, 'get_pid'), backends='proc'))[0]
+        self.assertEqual(obj.id.split('-'), [objs[0].id.split('-')[0], '3'])
+        self.assertEqual(obj.backend, 'proc')
+
+        # calls which can't be sent to the process are not run in this one
+        with self.assertRaises(CallErrors) as cm:
+            list(self.weboob.do(lambda backend: os.getpid(), backends='proc'))
+        backend, error, backtrace = cm.exception.errors[0]
+        self.assertIsInstance(error, BackendProcessError)
+
+    def test_process_storage(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            storage = StandardStorage(os.path.join(tmpdir, 'storage'))
+            backend = MyMockModule(self.weboob, 'proc', {'_process': 'yes'}, storage)
+            self.weboob.backend_instances['proc'] = backend
+            list(self.weboob.do('set_value', 42, backends='proc'))
+            self.assertEqual(backend.storage.get('value'), 42)
+            self.assertEqual(StandardStorage(os.path.join(tmpdir, 'storage')).get('backends', 'proc', 'value'), 42)
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_concurrent_calls(self):
+        self.weboob.backend_instances['concurrent'] = MyConcurrentMockModule(self.weboob, 'concurrent')
+        start = time.time()
+        calls = [self.weboob.do('get_browser', backends='concurrent') for _ in xrange(3)]
+        ids = [list(call)[0].id for call in calls]
+        self.assertLess(time.time() - start, 0.5)
+        self.assertEqual(len(set(ids)), 3)
+
+        # browsers are reused by next calls
+        self.assertIn(list(self.weboob.do('get_browser', backends='concurrent'))[0].id, ids)
+
+    def test_concurrent_unload(self):
+        backend = MyConcurrentMockModule(self.weboob, 'concurrent')
+        self.weboob.backend_instances['concurrent'] = backend
+        calls = [self.weboob.do('get_browser', backends='concurrent') for _ in xrange(3)]
+        for _ in xrange(100):
+            if len(backend.started) == 3:
+                break
+            time.sleep(0.01)
+
+        # unloading waits for the end of running calls
+        self.weboob.unload_backends('concurrent')
+        self.assertEqual(backend.ended_before_deinit, 3)
+        for call in calls:
+            self.assertEqual(len(list(call)), 1)
+
+        # and closes the browsers they used
+        self.assertEqual(len(backend.browsers), 3)
+        for browser in backend.browsers:
+            self.assertTrue(browser.session.closed)
+
+    def test_metrics(self):
+        list(self.weboob.do('iter_things', 3, backends=['mock1', 'mock2']))
+        with self.assertRaises(CallErrors):
+            list(self.weboob.do('fail', backends='mock1'))
+
+        metrics = self.weboob.metrics.to_dict()
+        self.assertEqual(sorted(metrics), ['mock1', 'mock2'])
+        self.assertEqual(metrics['mock1']['iter_things']['results'], 3)
+        self.assertEqual(metrics['mock1']['iter_things']['first_result_time']['count'], 1)
+        self.assertEqual(metrics['mock1']['fail']['errors'], {'ValueError': 1})
+
+        prometheus = self.weboob.metrics.dump_prometheus()
+        self.assertIn('weboob_backend_results_total{backend="mock2",method="iter_things"} 3', prometheus)
+        self.assertIn('weboob_backend_errors_total{backend="mock1",method="fail",error="ValueError"} 1', prometheus)
+
+    def test_coalesce(self):
+        calls = self.weboob['mock1']._calls = []
+        results = []
+        threads = [self.weboob.do('get_slowly', 'abc', backends='mock1', coalesce=True).callback_thread(results.append)
+                   for _ in xrange(3)]
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(calls, ['abc'])
+        self.assertEqual([obj.id for obj in results], ['abc'] * 3)
+
+        # the call is over, so it is done again
+        list(self.weboob.do('get_slowly', 'abc', backends='mock1', coalesce=True))
+        self.assertEqual(calls, ['abc', 'abc'])
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+# Copyright(C) 2016 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+import os
+import shutil
+import sys
+import tempfile
+import time
+from unittest import TestCase
+
+from weboob.core.modules import ModulesLoader
+
+
+MODULE = """
+from weboob.capabilities.bank import CapBank
+from weboob.tools.backend import Module, BackendConfig
+from weboob.tools.value import Value, ValueBackendPassword
+
+
+class FakeBankModule(Module, CapBank):
+    NAME = 'fakebank'
+    MAINTAINER = u'John Doe'
+    EMAIL = 'john@example.org'
+    VERSION = '1.1'
+    DESCRIPTION = u'Fake bank'
+    CONFIG = BackendConfig(ValueBackendPassword('login', label='Login', masked=False),
+                           ValueBackendPassword('password', label='Password'),
+                           Value('website', label='Website', choices=['par', 'pro'], default='par'))
+"""
+
+
+# Class that tests the metadata of modules read without importing them
+class ModuleMetadataTest(TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.path, 'fakebank'))
+        with open(os.path.join(self.path, 'fakebank', '__init__.py'), 'w') as f:
+            f.write('from .module import FakeBankModule\n')
+        with open(os.path.join(self.path, 'fakebank', 'module.py'), 'w') as f:
+            f.write(MODULE)
+        self.index_path = os.path.join(self.path, 'modules.index')
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_metadata(self):
+        loader = ModulesLoader(self.path, '1.1', self.index_path)
+        info = loader.get_module_info('fakebank')
+        self.assertNotIn('fakebank', sys.modules)
+        self.assertEqual(loader.loaded, {})
+
+        self.assertEqual(info.name, 'fakebank')
+        self.assertEqual(info.version, '1.1')
+        self.assertEqual(info.maintainer, u'John Doe <john@example.org>')
+        self.assertEqual(info.capabilities, ['CapBank', 'CapCollection'])
+        self.assertTrue(info.has_caps('CapBank'))
+        self.assertFalse(info.has_caps('CapMessages'))
+        self.assertEqual([key for key, field in info.config], ['login', 'password', 'website'])
+        self.assertEqual([field['masked'] for key, field in info.config], [False, True, False])
+        self.assertEqual(info.config[2][1]['choices'], [('par', 'par'), ('pro', 'pro')])
+        self.assertEqual([i.name for i in loader.iter_modules_info(['CapBank'])], ['fakebank'])
+        self.assertEqual(list(loader.iter_modules_info(['CapMessages'])), [])
+
+    def test_index(self):
+        ModulesLoader(self.path, '1.1', self.index_path).get_module_info('fakebank')
+        self.assertTrue(os.path.exists(self.index_path))
+
+        loader = ModulesLoader(self.path, '1.1', self.index_path)
+        info = loader.get_module_info('fakebank')
+        self.assertEqual(info.config[0], ('login', loader.index['fakebank'].config[0][1]))
+
+        # the metadata are read again when a file of the module has changed
+        with open(os.path.join(self.path, 'fakebank', 'module.py'), 'w') as f:
+            f.write(MODULE.replace("'1.1'", "'1.2'"))
+        mtime = time.time() + 10
+        os.utime(os.path.join(self.path, 'fakebank', 'module.py'), (mtime, mtime))
+        self.assertEqual(loader.get_module_info('fakebank').version, '1.2')
+
+    def test_load_all(self):
+        loader = ModulesLoader(self.path, '1.1', self.index_path)
+        try:
+            # modules are selected without importing them
+            loader.load_all(['CapMessages'])
+            self.assertEqual(loader.loaded, {})
+            self.assertNotIn('fakebank', sys.modules)
+
+            loader.load_all(['CapBank'])
+            self.assertEqual(list(loader.loaded), ['fakebank'])
+        finally:
+            for name in ('fakebank', 'fakebank.module'):
+                sys.modules.pop(name, None)
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+# Copyright(C) 2016 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from unittest import TestCase
+
+from weboob.core.repositories import IProgress, Repositories, Repository
+
+
+INDEX = """[DEFAULT]
+name = example
+update = 201601011200
+maintainer = John Doe
+signed = 0
+key_update = 0
+url = https://updates.example.org/modules/1.1/main/
+
+[fakebank]
+version = %d
+capabilities = CapCollection CapBank
+description = Fake bank
+maintainer = John Doe <john@example.org>
+license = AGPLv3+
+icon =
+urls =
+"""
+
+
+class FakeResponse(object):
+    def __init__(self, status_code, content='', headers={}):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers
+
+    def iter_content(self, chunk_size):
+        yield self.content
+
+    def close(self):
+        pass
+
+
+class FakeBrowser(object):
+    def __init__(self):
+        self.requests = []
+
+    def open(self, url, headers=None):
+        self.requests.append((url, headers))
+        if headers and headers.get('If-None-Match') == '"v1"':
+            return FakeResponse(304)
+        return FakeResponse(200, INDEX % 201601011200, {'ETag': '"v1"'})
+
+
+# Mock that allows to represent a progress which displays nothing
+class SilentProgress(IProgress):
+    def progress(self, percent, message):
+        pass
+
+
+# Mock that allows to represent a browser downloading archives of modules
+class FakeArchiveBrowser(object):
+    def __init__(self):
+        self.requests = []
+
+    def open(self, url, stream=False):
+        self.requests.append(url)
+        return FakeResponse(200, 'archive')
+
+
+# Class that tests the cache of the indexes of repositories
+class RepositoriesCacheTest(TestCase):
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        # no source, to avoid an update
+        open(os.path.join(self.workdir, Repositories.SOURCES_LIST), 'w').close()
+        os.mkdir(os.path.join(self.workdir, Repositories.REPOS_DIR))
+        self.index_path = os.path.join(self.workdir, Repositories.REPOS_DIR, '00-example')
+        self.write_index(201601011200)
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir)
+
+    def write_index(self, version):
+        with open(self.index_path, 'w') as f:
+            f.write(INDEX % version)
+
+    def test_tarball_without_checksum(self):
+        repositories = Repositories(self.workdir, self.workdir, '1.1')
+        repositories.browser = FakeArchiveBrowser()
+        minfo = repositories.get_module_info('fakebank')
+        path = repositories.retrieve_tarball(minfo, SilentProgress())
+        with open(path) as f:
+            self.assertEqual(f.read(), 'archive')
+        os.remove(path)
+        # it can't be found in the cache, so it is not kept
+        self.assertEqual(os.listdir(repositories.tarballs_dir), [])
+
+        minfo.sha256 = hashlib.sha256('archive').hexdigest()
+        path = repositories.retrieve_tarball(minfo, SilentProgress())
+        self.assertEqual(os.listdir(repositories.tarballs_dir), ['%s.tar.gz' % minfo.sha256])
+        self.assertEqual(repositories.retrieve_tarball(minfo, SilentProgress()), path)
+        self.assertEqual(len(repositories.browser.requests), 2)
+
+    def test_cache(self):
+        repositories = Repositories(self.workdir, self.workdir, '1.1')
+        self.assertTrue(os.path.exists(os.path.join(repositories.modules_dir, Repositories.CACHE)))
+
+        repositories = Repositories(self.workdir, self.workdir, '1.1')
+        minfo = repositories.get_module_info('fakebank')
+        self.assertEqual(minfo.version, 201601011200)
+        self.assertEqual(minfo.capabilities, ['CapCollection', 'CapBank'])
+        self.assertEqual(minfo.url, 'https://updates.example.org/modules/1.1/main/fakebank.tar.gz')
+        self.assertEqual(repositories.repositories[0].update, 201601011200)
+
+        # the cache is invalidated when an index is modified
+        self.write_index(201602011200)
+        mtime = time.time() + 10
+        os.utime(self.index_path, (mtime, mtime))
+        repositories = Repositories(self.workdir, self.workdir, '1.1')
+        self.assertEqual(repositories.get_module_info('fakebank').version, 201602011200)
+
+
+# Class that tests the conditional download of the index of a repository
+class RepositoryIndexTest(TestCase):
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.index_path = os.path.join(self.workdir, '00-example')
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir)
+
+    def test_not_modified(self):
+        browser = FakeBrowser()
+        repository = Repository('https://updates.example.org/modules/1.1/main/')
+        repository.retrieve_index(browser, self.index_path)
+        self.assertEqual(browser.requests[0][1], {})
+        self.assertEqual(repository.etag, '"v1"')
+
+        # validators are saved with the index
+        repository = Repository(self.index_path)
+        self.assertEqual(repository.etag, '"v1"')
+
+        os.remove(self.index_path)
+        repository.retrieve_index(browser, self.index_path)
+        self.assertEqual(browser.requests[1][1], {'If-None-Match': '"v1"'})
+        self.assertEqual(repository.modules['fakebank'].version, 201601011200)
+        self.assertTrue(os.path.exists(self.index_path))
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+# Copyright(C) 2016 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+import os
+import random
+import signal
+import tempfile
+import time
+from threading import Timer
+from unittest import TestCase
+
+from weboob.core.ouiboube import WebNip
+from weboob.core.scheduler import Scheduler, HeapScheduler
+from weboob.tools.storage import StandardStorage
+
+
+# Class that tests the scheduler based on a heap
+class HeapSchedulerTest(TestCase):
+
+    def setUp(self):
+        self.scheduler = HeapScheduler(max_workers=2)
+        self.calls = []
+
+    def tearDown(self):
+        self.scheduler.want_stop()
+
+    def wait_calls(self, count, timeout=2):
+        start = time.time()
+        while len(self.calls) < count and time.time() - start < timeout:
+            time.sleep(0.01)
+
+    def test_schedule(self):
+        self.scheduler.schedule(0.1, self.calls.append, 'b')
+        self.scheduler.schedule(0.05, self.calls.append, 'a')
+        ev = self.scheduler.schedule(0.07, self.calls.append, 'canceled')
+        self.assertTrue(self.scheduler.cancel(ev))
+        self.assertFalse(self.scheduler.cancel(ev))
+        self.wait_calls(2)
+        time.sleep(0.1)
+        self.assertEqual(self.calls, ['a', 'b'])
+
+    def test_repeat(self):
+        ev = self.scheduler.repeat(0.05, self.calls.append, 'a')
+        self.wait_calls(3)
+        self.assertTrue(self.scheduler.cancel(ev))
+        time.sleep(0.1)
+        count = len(self.calls)
+        time.sleep(0.1)
+        self.assertEqual(len(self.calls), count)
+        self.assertGreaterEqual(count, 3)
+
+    def test_heap(self):
+        events = [self.scheduler.schedule(random.uniform(100, 200), self.calls.append, i) for i in xrange(500)]
+        random.shuffle(events)
+        for ev in events[:250]:
+            self.assertTrue(self.scheduler.cancel(ev))
+
+        heap = self.scheduler.heap
+        self.assertEqual(len(heap), 250)
+        for pos, (when, ev) in enumerate(heap):
+            self.assertEqual(self.scheduler.positions[ev], pos)
+            if pos > 0:
+                self.assertLessEqual(heap[(pos - 1) // 2], heap[pos])
+
+
+# Class that tests the repeated jobs saved in a storage
+class PersistentJobsTest(TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.yaml')
+        os.close(fd)
+        os.unlink(self.path)
+        self.scheduler = HeapScheduler(max_workers=1, storage=StandardStorage(self.path))
+        self.calls = []
+
+    def tearDown(self):
+        self.scheduler.want_stop()
+        os.unlink(self.path)
+
+    def wait_calls(self, count, timeout=2):
+        start = time.time()
+        while len(self.calls) < count and time.time() - start < timeout:
+            time.sleep(0.01)
+
+    def restart(self, last_run, missed, jitter=0):
+        storage = StandardStorage(self.path)
+        storage.load('scheduler', 'jobs', {})
+        storage.set('scheduler', 'jobs', 'job', 'last_run', last_run)
+        storage.save('scheduler', 'jobs')
+
+        self.scheduler.want_stop()
+        self.scheduler = HeapScheduler(max_workers=1, storage=StandardStorage(self.path))
+        return self.scheduler.repeat(100, self.calls.append, 'a', name='job', missed=missed, jitter=jitter)
+
+    def next_call(self, ev):
+        return self.scheduler.heap[self.scheduler.positions[ev]][0]
+
+    def test_save(self):
+        start = time.time()
+        self.scheduler.repeat(100, self.calls.append, 'a', name='job')
+        self.wait_calls(1)
+        time.sleep(0.1)
+        last_run = StandardStorage(self.path).get('scheduler', 'jobs', 'job', 'last_run')
+        self.assertGreaterEqual(last_run, start)
+
+        ev = self.restart(last_run, HeapScheduler.MISSED_ONCE)
+        time.sleep(0.1)
+        self.assertEqual(self.calls, ['a'])
+        self.assertAlmostEqual(self.next_call(ev), last_run + 100, delta=1)
+
+    def test_jitter(self):
+        start = time.time()
+        ev = self.scheduler.repeat(100, self.calls.append, 'a', jitter=50)
+        self.assertTrue(start <= self.next_call(ev) <= start + 51)
+
+    def test_missed_skip(self):
+        last_run = time.time() - 350
+        ev = self.restart(last_run, HeapScheduler.MISSED_SKIP)
+        time.sleep(0.1)
+        self.assertEqual(self.calls, [])
+        self.assertAlmostEqual(self.next_call(ev), last_run + 400, delta=1)
+
+    def test_missed_once(self):
+        ev = self.restart(time.time() - 350, HeapScheduler.MISSED_ONCE)
+        self.wait_calls(1)
+        time.sleep(0.1)
+        self.assertEqual(self.calls, ['a'])
+        self.assertAlmostEqual(self.next_call(ev), time.time() + 100, delta=1)
+
+    def test_missed_jitter(self):
+        start = time.time()
+        ev = self.restart(start - 350, HeapScheduler.MISSED_ONCE, None)
+        self.assertTrue(start <= self.next_call(ev) <= start + HeapScheduler.MISSED_JITTER + 1)
+
+    def test_weboob_storage(self):
+        self.scheduler.want_stop()
+        weboob = WebNip(modules_path=False, storage=StandardStorage(self.path))
+        self.scheduler = weboob.scheduler
+        weboob.repeat(100, self.calls.append, 'a', name='job')
+        self.wait_calls(1)
+        time.sleep(0.1)
+        self.assertIsNotNone(StandardStorage(self.path).get('scheduler', 'jobs', 'job', 'last_run', default=None))
+
+    def test_missed_catch_up(self):
+        last_run = time.time() - 350
+        ev = self.restart(last_run, HeapScheduler.MISSED_CATCH_UP)
+        self.wait_calls(3)
+        time.sleep(0.1)
+        self.assertEqual(self.calls, ['a', 'a', 'a'])
+        self.assertAlmostEqual(self.next_call(ev), time.time() + 100, delta=1)
+        self.assertAlmostEqual(StandardStorage(self.path).get('scheduler', 'jobs', 'job', 'last_run'),
+                               last_run + 300, delta=0.001)
+
+
+# Class that tests the main loop of schedulers
+class SchedulerRunTest(TestCase):
+
+    def test_want_stop(self):
+        for scheduler in (Scheduler(), HeapScheduler()):
+            scheduler.schedule(0.1, scheduler.want_stop)
+            start = time.time()
+            self.assertTrue(scheduler.run())
+            self.assertLess(time.time() - start, 1)
+
+    def test_interrupt(self):
+        scheduler = Scheduler()
+        timer = Timer(0.1, os.kill, (os.getpid(), signal.SIGINT))
+        timer.start()
+        with self.assertRaises(KeyboardInterrupt):
+            scheduler.run()
+        timer.join()
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2010-2016 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+import sys
+from threading import Thread, Lock, current_thread, local
+try:
+    import Queue
+except ImportError:
+    import queue as Queue
+
+from weboob.tools.compat import reraise
+from weboob.tools.log import getLogger
+from weboob.tools.misc import get_backtrace
+
+
+__all__ = ['WorkerPool']
+
+
+class WorkerPool(object):
+    """
+    Pool of reusable worker threads.
+
+    Threads are started lazily, only when no idle worker is able to take a
+    submitted task, and never more than *size* of them are alive, except when
+    a task is submitted from one of the workers themselves: an extra thread is
+    then spawned to avoid a deadlock with nested calls.
+
+    :param size: maximum number of worker threads
+    :type size: :class:`int`
+    :param name: prefix of the threads names
+    :type name: :class:`str`
+    """
+
+    # maximum time to wait in map() before checking signals
+    WAIT_TIMEOUT = 1
+
+    def __init__(self, size=100, name='worker'):
+        if size < 1:
+            raise ValueError('The size of a pool must be at least 1')
+
+        self.logger = getLogger('workers')
+        self.size = size
+        self.name = name
+        self.mutex = Lock()
+        self.tasks = Queue.Queue()
+        self.threads = set()
+        self.idle = 0
+        self.created = 0
+        self._worker = local()
+        self.stopped = False
+
+    def submit(self, function, *args, **kwargs):
+        """
+        Run a function in a worker thread.
+
+        :param function: function to call
+        :type function: callable
+        """
+        with self.mutex:
+            if self.stopped:
+                raise RuntimeError('Unable to submit a task to a stopped pool')
+
+            self.tasks.put((function, args, kwargs))
+            if self.idle < self.tasks.qsize() and \
+               (len(self.threads) < self.size or current_thread() in self.threads):
+                self._spawn()
+
+    def _spawn(self):
+        self.created += 1
+        thread = Thread(target=self._worker_run, name='%s-%d' % (self.name, self.created))
+        thread.daemon = True
+        self.threads.add(thread)
+        thread.start()
+
+    def _worker_run(self):
+        thread = current_thread()
+        with self.mutex:
+            self.idle += 1
+        try:
+            while True:
+                task = self.tasks.get()
+                with self.mutex:
+                    self.idle -= 1
+                self._worker.released = False
+
+                if task is None:
+                    return
+
+                function, args, kwargs = task
+                try:
+                    function(*args, **kwargs)
+                except Exception:
+                    # never let a task kill its worker
+                    self.logger.error(u'Uncaught error in worker: %s', get_backtrace())
+                finally:
+                    del task, function, args, kwargs
+                    self.release()
+        finally:
+            with self.mutex:
+                self.threads.discard(thread)
+
+    def release(self):
+        """
+        Count the worker running the current task as idle, before the end of
+        the task.
+
+        Tasks which notify another thread of their end have to call it just
+        before, as this thread may submit new tasks at once: otherwise new
+        workers would be spawned while this one is about to be idle. It does
+        nothing when not called from a worker.
+        """
+        if getattr(self._worker, 'released', True):
+            return
+        self._worker.released = True
+        with self.mutex:
+            self.idle += 1
+
+    def map(self, function, iterable):
+        """
+        Call a function on every item in worker threads, and wait for all
+        calls to end.
+
+        If a call raises an exception, the first one is raised again once
+        every call is finished, with its traceback.
+
+        :param function: function to call with an item
+        :type function: callable
+        :returns: results of calls, in the order of items
+        :rtype: :class:`list`
+        """
+        items = list(iterable)
+        results = [None] * len(items)
+        errors = [None] * len(items)
+        done = Queue.Queue()
+
+        def run(index, item):
+            try:
+                results[index] = function(item)
+            except Exception:
+                errors[index] = sys.exc_info()
+            finally:
+                self.release()
+                done.put(index)
+
+        for index, item in enumerate(items):
+            self.submit(run, index, item)
+        remaining = len(items)
+        while remaining:
+            # Wait with a timeout, otherwise signals like KeyboardInterrupt
+            # are not handled by the main thread until every call ends.
+            try:
+                done.get(timeout=self.WAIT_TIMEOUT)
+            except Queue.Empty:
+                continue
+            remaining -= 1
+
+        for error in errors:
+            if error is not None:
+                reraise(*error)
+        return results
+
+    def count_threads(self):
+        """
+        Get the number of alive worker threads.
+        """
+        with self.mutex:
+            return len(self.threads)
+
+    def shutdown(self, wait=True):
+        """
+        Stop every worker once the pending tasks are processed.
+
+        :param wait: if true, block until all workers have exited
+        :type wait: :class:`bool`
+        """
+        with self.mutex:
+            self.stopped = True
+            threads = list(self.threads)
+            for _ in threads:
+                self.tasks.put(None)
+
+        if wait:
+            for thread in threads:
+                if thread is not current_thread():
+                    thread.join()
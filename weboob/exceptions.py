@@ -54,6 +54,12 @@ class ParseError(Exception):
     pass
 
 
+class CallCancelled(Exception):
+    """
+    The call running in this thread has been cancelled by its caller.
+    """
+
+
 class FormFieldConversionWarning(UserWarning):
     """
     A value has been set to a form's field and has been implicitly converted.
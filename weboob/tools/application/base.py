@@ -36,6 +36,7 @@ from weboob.tools.config.iconfig import ConfigError
 from weboob.exceptions import FormFieldConversionWarning
 from weboob.tools.log import createColoredFormatter, getLogger, DEBUG_FILTERS, settings as log_settings
 from weboob.tools.misc import to_unicode
+from weboob.tools.startup import startup_step, stop_profiler
 from .results import ResultsConditionError
 
 __all__ = ['Application']
@@ -45,6 +46,81 @@ class MoreResultsAvailable(Exception):
     pass
 
 
+class CompleteCall(object):
+    """
+    Call a method of a backend, and complete the objects it returns.
+
+    Contrary to bound methods of applications, it can be pickled to be run
+    in the process of a backend.
+
+    :param count: maximum number of results, or None
+    :type count: :class:`int`
+    :param selected_fields: fields to fill, or None for all fields
+    :type selected_fields: :class:`tuple`
+    :param function: backend method name, or callable object
+    :param condition: condition on results, or None
+    :type condition: :class:`ResultsCondition`
+    :param is_default_count: if True, raise :class:`MoreResultsAvailable`
+                             when there are more than count results
+    :type is_default_count: :class:`bool`
+    """
+
+    def __init__(self, count, selected_fields, function, condition=None, is_default_count=True):
+        assert count is None or count > 0
+        self.count = count
+        self.selected_fields = selected_fields
+        self.function = function
+        self.condition = condition
+        self.is_default_count = is_default_count
+        # name of the called method, used in metrics of calls
+        if isinstance(function, basestring):
+            self.__name__ = function
+        else:
+            self.__name__ = getattr(function, '__name__', repr(function))
+
+    @staticmethod
+    def complete_obj(backend, fields, obj):
+        if not obj:
+            return obj
+        if not isinstance(obj, BaseObject):
+            return obj
+
+        obj.backend = backend.name
+        if fields is None or len(fields) > 0:
+            backend.fillobj(obj, fields)
+        return obj
+
+    def complete_iter(self, backend, res):
+        modif = 0
+
+        for i, sub in enumerate(res):
+            sub = self.complete_obj(backend, self.selected_fields, sub)
+            if self.condition and self.condition.limit and \
+               self.condition.limit == i:
+                return
+
+            if self.condition and not self.condition.is_valid(sub):
+                modif += 1
+            else:
+                if self.count and i - modif == self.count:
+                    if self.is_default_count:
+                        raise MoreResultsAvailable()
+                    else:
+                        return
+                yield sub
+
+    def __call__(self, backend, *args, **kwargs):
+        if callable(self.function):
+            res = self.function(backend, *args, **kwargs)
+        else:
+            res = getattr(backend, self.function)(*args, **kwargs)
+
+        if hasattr(res, '__iter__'):
+            return self.complete_iter(backend, res)
+        else:
+            return self.complete_obj(backend, self.selected_fields, res)
+
+
 class ApplicationStorage(object):
     def __init__(self, name, storage):
         self.name = name
@@ -144,7 +220,8 @@ class Application(object):
     def __init__(self, option_parser=None):
         self.encoding = self.guess_encoding()
         self.logger = getLogger(self.APPNAME)
-        self.weboob = self.create_weboob()
+        with startup_step('create_weboob'):
+            self.weboob = self.create_weboob()
         if self.CONFDIR is None:
             self.CONFDIR = self.weboob.workdir
         self.config = None
@@ -211,9 +288,10 @@ class Application(object):
         elif os.path.sep not in path:
             path = os.path.join(self.CONFDIR, path)
 
-        storage = klass(path)
-        self.storage = ApplicationStorage(self.APPNAME, storage)
-        self.storage.load(self.STORAGE)
+        with startup_step('create_storage'):
+            storage = klass(path)
+            self.storage = ApplicationStorage(self.APPNAME, storage)
+            self.storage.load(self.STORAGE)
 
         if not localonly:
             self.weboob.storage = storage
@@ -239,8 +317,9 @@ class Application(object):
         elif os.path.sep not in path:
             path = os.path.join(self.CONFDIR, path)
 
-        self.config = klass(path)
-        self.config.load(self.CONFIG)
+        with startup_step('load_config'):
+            self.config = klass(path)
+            self.config.load(self.CONFIG)
 
     def main(self, argv):
         """
@@ -255,7 +334,10 @@ class Application(object):
             names = self.options.backends.split(',')
         if exclude is None and self.options.exclude_backends:
             exclude = self.options.exclude_backends.split(',')
-        loaded = self.weboob.load_backends(caps, names, exclude=exclude, *args, **kwargs)
+        with startup_step('load_backends'):
+            loaded = self.weboob.load_backends(caps, names, exclude=exclude, *args, **kwargs)
+        # the application is now ready
+        stop_profiler()
         if not loaded:
             logging.info(u'No backend loaded')
         return loaded
@@ -270,47 +352,17 @@ class Application(object):
                 version = '%s v%s' % (self.APPNAME, self.VERSION)
         return version
 
-    def _do_complete_obj(self, backend, fields, obj):
-        if not obj:
-            return obj
-        if not isinstance(obj, BaseObject):
-            return obj
+    def _get_complete_call(self, count, selected_fields, function):
+        return CompleteCall(count, selected_fields, function, self.condition, self._is_default_count)
 
-        obj.backend = backend.name
-        if fields is None or len(fields) > 0:
-            backend.fillobj(obj, fields)
-        return obj
+    def _do_complete_obj(self, backend, fields, obj):
+        return CompleteCall.complete_obj(backend, fields, obj)
 
     def _do_complete_iter(self, backend, count, fields, res):
-        modif = 0
-
-        for i, sub in enumerate(res):
-            sub = self._do_complete_obj(backend, fields, sub)
-            if self.condition and self.condition.limit and \
-               self.condition.limit == i:
-                return
-
-            if self.condition and not self.condition.is_valid(sub):
-                modif += 1
-            else:
-                if count and i - modif == count:
-                    if self._is_default_count:
-                        raise MoreResultsAvailable()
-                    else:
-                        return
-                yield sub
+        return self._get_complete_call(count, fields, None).complete_iter(backend, res)
 
     def _do_complete(self, backend, count, selected_fields, function, *args, **kwargs):
-        assert count is None or count > 0
-        if callable(function):
-            res = function(backend, *args, **kwargs)
-        else:
-            res = getattr(backend, function)(*args, **kwargs)
-
-        if hasattr(res, '__iter__'):
-            return self._do_complete_iter(backend, count, selected_fields, res)
-        else:
-            return self._do_complete_obj(backend, selected_fields, res)
+        return self._get_complete_call(count, selected_fields, function)(backend, *args, **kwargs)
 
     def bcall_error_handler(self, backend, error, backtrace):
         """
@@ -458,14 +510,16 @@ class Application(object):
             args = [(cls.stdin.encoding and isinstance(arg, bytes) and arg.decode(cls.stdin.encoding) or to_unicode(arg)) for arg in sys.argv]
 
         try:
-            app = cls()
+            with startup_step('create_application'):
+                app = cls()
         except BackendsConfig.WrongPermissions as e:
             print(e, file=cls.stderr)
             sys.exit(1)
 
         try:
             try:
-                args = app.parse_args(args)
+                with startup_step('parse_args'):
+                    args = app.parse_args(args)
                 sys.exit(app.main(args))
             except KeyboardInterrupt:
                 print('Program killed by SIGINT', file=cls.stderr)
@@ -485,4 +539,5 @@ class Application(object):
                 print('%s' % e, file=cls.stderr)
                 sys.exit(1)
         finally:
+            stop_profiler()
             app.deinit()
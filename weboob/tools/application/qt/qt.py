@@ -63,7 +63,8 @@ class QtScheduler(IScheduler):
         self.app.connect(timer, SIGNAL("timeout()"), lambda: self.timeout(count, None, function, *args))
         self.timers[count] = timer
 
-    def repeat(self, interval, function, *args):
+    def repeat(self, interval, function, *args, **kwargs):
+        # jobs are not saved, so options of HeapScheduler.repeat() are ignored
         timer = QTimer()
         timer.setSingleShot(False)
 
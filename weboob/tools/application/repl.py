@@ -282,7 +282,7 @@ class ReplApplication(Cmd, ConsoleApplication):
             return self.objects
         elif method is not None:
             kwargs['backends'] = self.enabled_backends
-            for _object in self.weboob.do(self._do_complete, None, None, method, *args, **kwargs):
+            for _object in self.weboob.do(self._get_complete_call(None, None, method), *args, **kwargs):
                 self.add_object(_object)
             return self.objects
         # XXX: what can we do without method?
@@ -370,7 +370,7 @@ class ReplApplication(Cmd, ConsoleApplication):
                 print('Warning: some selected fields will not be displayed by the formatter. Fallback to another. Hint: use option -f', file=self.stderr)
                 self.formatter = self.formatters_loader.build_formatter(ReplApplication.DEFAULT_FORMATTER)
 
-        return self.weboob.do(self._do_complete, self.options.count, fields, function, *args, **kwargs)
+        return self.weboob.do(self._get_complete_call(self.options.count, fields, function), *args, **kwargs)
 
     # -- command tools ------------
     def parse_command_args(self, line, nb, req_n=None):
@@ -803,6 +803,31 @@ class ReplApplication(Cmd, ConsoleApplication):
             for handler in logging.root.handlers:
                 handler.setLevel(level)
 
+    def complete_metrics(self, text, line, begidx, endidx):
+        args = line.split(' ')
+        if len(args) == 2:
+            return ('json', 'prometheus')
+        return ()
+
+    def do_metrics(self, line):
+        """
+        metrics [json | prometheus]
+
+        Display metrics of calls on backends since the application start.
+
+        Default format is json.
+        """
+        args = self.parse_command_args(line, 1, 0)
+        fmt = args[0] or 'json'
+        if fmt == 'json':
+            print(self.weboob.metrics.dump_json())
+        elif fmt == 'prometheus':
+            self.stdout.write(self.weboob.metrics.dump_prometheus())
+        else:
+            print('Unknown format: "%s"' % fmt, file=self.stderr)
+            print('Availables: json prometheus', file=self.stderr)
+            return 2
+
     def do_condition(self, line):
         """
         condition [EXPRESSION | off]
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+# Copyright(C) 2016 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from unittest import TestCase
+
+import weboob
+
+
+SCRIPT = """
+import atexit, sys
+before = set(sys.modules)
+
+def report():
+    sys.stderr.write('MODULES %s\\n' % ' '.join(m for m in set(sys.modules) - before if sys.modules[m] is not None))
+atexit.register(report)
+
+from weboob.applications.weboobcfg import WeboobCfg
+WeboobCfg.run(['weboob-config', '--help'])
+"""
+
+
+# Class that tests the modules imported by applications
+class ImportsTest(TestCase):
+    # maximum number of modules imported to display the help of weboob-config
+    MAX_MODULES = 130
+    # dependencies only imported by commands which need them
+    HEAVY_MODULES = ('requests', 'lxml', 'dateutil', 'yaml', 'prettytable', 'multiprocessing')
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        # no repository, to avoid an update
+        open(os.path.join(self.workdir, 'sources.list'), 'w').close()
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir)
+
+    def test_weboobcfg_help(self):
+        env = dict(os.environ, WEBOOB_WORKDIR=self.workdir,
+                   PYTHONPATH=os.path.dirname(os.path.dirname(os.path.abspath(weboob.__file__))))
+        env.pop('WEBOOB_PROFILE_STARTUP', None)
+        process = subprocess.Popen([sys.executable, '-c', SCRIPT], env=env,
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        stdout, stderr = process.communicate()
+        self.assertEqual(process.returncode, 0, stderr)
+
+        modules = [line for line in stderr.splitlines() if line.startswith('MODULES ')][0].split()[1:]
+        self.assertLessEqual(len(modules), self.MAX_MODULES, sorted(modules))
+        for name in self.HEAVY_MODULES:
+            self.assertNotIn(name, modules)
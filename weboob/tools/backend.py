@@ -19,7 +19,8 @@
 
 
 import os
-from threading import RLock
+from contextlib import contextmanager
+from threading import RLock, Lock, Semaphore, local
 from copy import copy
 
 from weboob.capabilities.base import BaseObject, FieldNotFound, \
@@ -239,6 +240,11 @@ class Module(object):
     STORAGE = {}
     # Browser class
     BROWSER = None
+    # Number of calls which can be run at the same time on a backend. Set it
+    # only if methods are safe to be called concurrently, for example for
+    # read-only capabilities: each concurrent call then uses its own browser
+    # instance, with its own cookies.
+    CONCURRENT_CALLS = 1
     # URL to an optional icon.
     # If you want to create your own icon, create a 'favicon.ico' ico in
     # the module's directory, and keep the ICON value to None.
@@ -256,10 +262,55 @@ class Module(object):
         """
 
     def __enter__(self):
-        self.lock.acquire()
+        if self.CONCURRENT_CALLS > 1:
+            self._acquire_browser()
+        else:
+            self.lock.acquire()
 
     def __exit__(self, t, v, tb):
-        self.lock.release()
+        if self.CONCURRENT_CALLS > 1:
+            self._release_browser()
+        else:
+            self.lock.release()
+
+    def _acquire_browser(self):
+        depth = getattr(self._call, 'depth', 0)
+        if depth == 0:
+            self._call_slots.acquire()
+            with self._browsers_mutex:
+                self._call.browser = self._idle_browsers.pop() if self._idle_browsers else None
+        self._call.depth = depth + 1
+
+    def _release_browser(self):
+        self._call.depth -= 1
+        if self._call.depth == 0:
+            browser, self._call.browser = self._call.browser, None
+            if browser is not None:
+                with self._browsers_mutex:
+                    self._idle_browsers.append(browser)
+            self._call_slots.release()
+
+    @contextmanager
+    def exclusive(self):
+        """
+        Context manager to use the backend while no call is running on it,
+        for example to unload it: it waits for the end of running calls, and
+        blocks new ones.
+        """
+        with self.lock:
+            if self.CONCURRENT_CALLS == 1:
+                yield
+                return
+
+            # a slot is already taken if the current thread runs a call
+            slots = self.CONCURRENT_CALLS - (1 if getattr(self._call, 'depth', 0) else 0)
+            for _ in xrange(slots):
+                self._call_slots.acquire()
+            try:
+                yield
+            finally:
+                for _ in xrange(slots):
+                    self._call_slots.release()
 
     def __repr__(self):
         return u"<Backend %r>" % self.name
@@ -269,6 +320,12 @@ class Module(object):
         self.weboob = weboob
         self.name = name
         self.lock = RLock()
+        if self.CONCURRENT_CALLS > 1:
+            # Pool of browsers, used by calls run concurrently.
+            self._call = local()
+            self._call_slots = Semaphore(self.CONCURRENT_CALLS)
+            self._browsers_mutex = Lock()
+            self._idle_browsers = []
         if config is None:
             config = {}
 
@@ -283,9 +340,17 @@ class Module(object):
 
     def deinit(self):
         """
-        This abstract method is called when the backend is unloaded.
+        This method is called when the backend is unloaded.
+
+        It closes the browsers of the pool used by concurrent calls, so
+        call it if you override it on a module with :attr:`CONCURRENT_CALLS`.
         """
-        pass
+        if self.CONCURRENT_CALLS > 1:
+            with self._browsers_mutex:
+                browsers, self._idle_browsers = self._idle_browsers, []
+            for browser in browsers:
+                if hasattr(browser, 'session'):
+                    browser.session.close()
 
     _browser = None
 
@@ -296,7 +361,16 @@ class Module(object):
         of this attribute, to avoid useless pages access.
 
         Note that the :func:`create_default_browser` method is called to create it.
+
+        When :attr:`CONCURRENT_CALLS` is greater than 1, every call running
+        at the same time on the backend gets its own browser, taken from a
+        pool of at most :attr:`CONCURRENT_CALLS` browsers.
         """
+        if self.CONCURRENT_CALLS > 1 and getattr(self._call, 'depth', 0):
+            if self._call.browser is None:
+                self._call.browser = self.create_default_browser()
+            return self._call.browser
+
         if self._browser is None:
             self._browser = self.create_default_browser()
         return self._browser
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2016 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+
+import time
+from contextlib import contextmanager
+from threading import local
+
+from weboob.exceptions import CallCancelled
+
+
+__all__ = ['cancellable', 'is_cancelled', 'check_cancelled', 'sleep']
+
+
+_context = local()
+
+
+@contextmanager
+def cancellable(event):
+    """
+    Context manager to run a block of code in the current thread on behalf of
+    a call which can be cancelled by setting *event*.
+
+    Code running inside can use :func:`check_cancelled` to stop as soon as
+    possible.
+
+    :param event: event set when the call is cancelled
+    :type event: :class:`threading.Event`
+    """
+    previous = getattr(_context, 'event', None)
+    _context.event = event
+    try:
+        yield
+    finally:
+        _context.event = previous
+
+
+def is_cancelled():
+    """
+    Check if the call running in the current thread has been cancelled.
+
+    :rtype: :class:`bool`
+    """
+    event = getattr(_context, 'event', None)
+    return event is not None and event.is_set()
+
+
+def check_cancelled():
+    """
+    Raise :class:`weboob.exceptions.CallCancelled` if the call running in the
+    current thread has been cancelled.
+    """
+    if is_cancelled():
+        raise CallCancelled()
+
+
+def sleep(delay):
+    """
+    Sleep, but stop as soon as the call running in the current thread is
+    cancelled.
+
+    :param delay: number of seconds to sleep
+    :type delay: :class:`float`
+    :raises: :class:`weboob.exceptions.CallCancelled` if the call has been
+             cancelled
+    """
+    event = getattr(_context, 'event', None)
+    if event is None:
+        time.sleep(delay)
+    elif event.wait(delay):
+        raise CallCancelled()
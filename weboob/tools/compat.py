@@ -17,8 +17,10 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with weboob. If not, see <http://www.gnu.org/licenses/>.
 
+import sys
 
-__all__ = ['unicode', 'long', 'basestring']
+
+__all__ = ['unicode', 'long', 'basestring', 'reraise']
 
 
 try:
@@ -35,3 +37,18 @@ try:
     basestring = basestring
 except NameError:
     basestring = str
+
+if sys.version_info[0] >= 3:
+    def reraise(tp, value, tb=None):
+        """
+        Raise an exception again with its traceback, as given by
+        :func:`sys.exc_info`.
+        """
+        raise value.with_traceback(tb)
+else:
+    exec('def reraise(tp, value, tb=None):\n'
+         '    """\n'
+         '    Raise an exception again with its traceback, as given by\n'
+         '    :func:`sys.exc_info`.\n'
+         '    """\n'
+         '    raise tp, value, tb\n')
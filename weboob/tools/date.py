@@ -17,26 +17,23 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with weboob. If not, see <http://www.gnu.org/licenses/>.
 
-import dateutil.parser
 from datetime import date as real_date, datetime as real_datetime, timedelta
 import time
 import re
-try:
-    from dateutil import tz
-except ImportError:
-    raise ImportError('Please install python-dateutil')
 
 
 __all__ = ['local2utc', 'utc2local', 'LinearDateGuesser', 'date', 'datetime', 'new_date', 'new_datetime', 'closest_date']
 
 
 def local2utc(dateobj):
+    from dateutil import tz
     dateobj = dateobj.replace(tzinfo=tz.tzlocal())
     dateobj = dateobj.astimezone(tz.tzutc())
     return dateobj
 
 
 def utc2local(dateobj):
+    from dateutil import tz
     dateobj = dateobj.replace(tzinfo=tz.tzutc())
     dateobj = dateobj.astimezone(tz.tzlocal())
     return dateobj
@@ -274,6 +271,7 @@ def parse_french_date(date):
     for fr, en in DATE_TRANSLATE_FR:
         date = fr.sub(en, date)
 
+    import dateutil.parser
     return dateutil.parser.parse(date)
 
 
@@ -115,6 +115,8 @@ def ratelimit(group, delay):
 
     This function is not thread-safe. For reasonably non-critical rate
     limiting (like accessing a website), it should be sufficient nevertheless.
+    Browsers should rather use their RATE_LIMIT attribute, which limits
+    requests per host in a thread-safe way.
 
     @param group [string]  rate limiting group name, alphanumeric
     @param delay [int]  delay in seconds between each call
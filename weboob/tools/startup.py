@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2016 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Profiler of the startup of applications.
+
+It is enabled by setting the WEBOOB_PROFILE_STARTUP environment variable to
+the path of a file: every import and every step of the initialization is
+timed, and the tree of costs, sorted by cumulative time, is printed on stderr
+and written to this file once the backends are loaded.
+
+Imports and steps of other threads, like the workers which load backends,
+are recorded under the current step of the main thread.
+"""
+
+from __future__ import print_function
+
+import sys
+from contextlib import contextmanager
+from threading import Lock, current_thread
+from time import time
+try:
+    import __builtin__ as builtins
+except ImportError:
+    import builtins
+
+
+__all__ = ['StartupProfiler', 'start_profiler', 'stop_profiler', 'startup_step']
+
+
+class ProfileNode(object):
+    def __init__(self, name):
+        self.name = name
+        self.start = time()
+        self.time = 0
+        self.parent = None
+        self.children = []
+
+    @property
+    def self_time(self):
+        # children run by several threads may last longer than their parent
+        return max(0, self.time - sum(child.time for child in self.children))
+
+    def iter_lines(self, min_time=0, depth=0):
+        yield '%10.1fms %10.1fms  %s%s' % (self.time * 1000, self.self_time * 1000, '  ' * depth, self.name)
+        for child in sorted(self.children, key=lambda child: child.time, reverse=True):
+            if child.time >= min_time:
+                for line in child.iter_lines(min_time, depth + 1):
+                    yield line
+
+
+class StartupProfiler(object):
+    """
+    Record the time spent in imports and in steps of the startup.
+
+    :param filename: file where the tree of costs is written
+    :type filename: :class:`str`
+    """
+
+    # nodes shorter than this are not printed on stderr
+    MIN_PRINTED_TIME = 0.001
+
+    def __init__(self, filename=None):
+        self.filename = filename
+        self.root = ProfileNode('startup')
+        self.thread = current_thread()
+        # nodes being measured, by thread
+        self.stacks = {self.thread: [self.root]}
+        self.mutex = Lock()
+        self.running = False
+        self.original_import = None
+
+    def start(self):
+        self.original_import = builtins.__import__
+        builtins.__import__ = self._import
+        self.root.start = time()
+        self.running = True
+
+    def stop(self):
+        """
+        Stop recording, and report the tree of costs.
+        """
+        if not self.running:
+            return
+
+        self.running = False
+        # steps which are not finished yet are measured until now
+        now = time()
+        with self.mutex:
+            for stack in self.stacks.itervalues():
+                for node in stack:
+                    node.time = now - node.start
+        if builtins.__import__ == self._import:
+            builtins.__import__ = self.original_import
+
+        print('Startup profile (cumulative, self, name):', file=sys.stderr)
+        for line in self.root.iter_lines(self.MIN_PRINTED_TIME):
+            print(line, file=sys.stderr)
+
+        if self.filename:
+            with open(self.filename, 'w') as f:
+                for line in self.root.iter_lines():
+                    f.write(line + '\n')
+            print('Startup profile saved in %s' % self.filename, file=sys.stderr)
+
+    def _import(self, name, *args, **kwargs):
+        if not self.running:
+            return self.original_import(name, *args, **kwargs)
+
+        count = len(sys.modules)
+        node = ProfileNode('import %s' % self._resolve_name(name, *args, **kwargs))
+        with self._measure(node):
+            module = self.original_import(name, *args, **kwargs)
+
+        # only keep imports which have actually loaded something
+        if len(sys.modules) == count:
+            with self.mutex:
+                node.parent.children.remove(node)
+        return module
+
+    @staticmethod
+    def _resolve_name(name, globals=None, locals=None, fromlist=None, level=-1):
+        # get the absolute name of relative imports
+        if level <= 0 or not globals or '__name__' not in globals:
+            return name
+
+        package = globals.get('__package__')
+        if not package:
+            package = globals['__name__']
+            if '__path__' not in globals:
+                package = package.rpartition('.')[0]
+        package = package.rsplit('.', level - 1)[0]
+        return '%s.%s' % (package, name) if name else package
+
+    @contextmanager
+    def _measure(self, node):
+        with self.mutex:
+            stack = self.stacks.setdefault(current_thread(), [])
+            # the first node of other threads is put under the current node
+            # of the main thread
+            node.parent = stack[-1] if stack else self.stacks[self.thread][-1]
+            node.parent.children.append(node)
+        stack.append(node)
+        node.start = time()
+        try:
+            yield
+        finally:
+            if self.running:
+                node.time = time() - node.start
+                stack.pop()
+
+    def step(self, name):
+        """
+        Context manager to measure a step of the initialization.
+        """
+        return self._measure(ProfileNode(name))
+
+
+profiler = None
+
+
+def start_profiler(filename=None):
+    global profiler
+    profiler = StartupProfiler(filename)
+    profiler.start()
+
+
+def stop_profiler():
+    if profiler is not None:
+        profiler.stop()
+
+
+@contextmanager
+def startup_step(name):
+    """
+    Measure a step of the startup, if the profiler is running.
+    """
+    if profiler is None or not profiler.running:
+        yield
+    else:
+        with profiler.step(name):
+            yield
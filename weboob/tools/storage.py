@@ -19,6 +19,7 @@
 
 
 from copy import deepcopy
+from threading import RLock
 
 from .config.yamlconfig import YamlConfig
 
@@ -59,25 +60,32 @@ class StandardStorage(IStorage):
     def __init__(self, path):
         self.config = YamlConfig(path)
         self.config.load()
+        # the storage is shared by backends loaded or called in parallel
+        self.mutex = RLock()
 
     def load(self, what, name, default={}):
-        d = {}
-        if what not in self.config.values:
-            self.config.values[what] = {}
-        else:
-            d = self.config.values[what].get(name, {})
+        with self.mutex:
+            d = {}
+            if what not in self.config.values:
+                self.config.values[what] = {}
+            else:
+                d = self.config.values[what].get(name, {})
 
-        self.config.values[what][name] = deepcopy(default)
-        self.config.values[what][name].update(d)
+            self.config.values[what][name] = deepcopy(default)
+            self.config.values[what][name].update(d)
 
     def save(self, what, name):
-        self.config.save()
+        with self.mutex:
+            self.config.save()
 
     def set(self, what, name, *args):
-        self.config.set(what, name, *args)
+        with self.mutex:
+            self.config.set(what, name, *args)
 
     def delete(self, what, name, *args):
-        self.config.delete(what, name, *args)
+        with self.mutex:
+            self.config.delete(what, name, *args)
 
     def get(self, what, name, *args, **kwargs):
-        return self.config.get(what, name, *args, **kwargs)
+        with self.mutex:
+            return self.config.get(what, name, *args, **kwargs)